@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time as timer
+import tracemalloc
+
+import numpy as np
+
+import scene
+from fmcwradar import Fmcw
+from vehicle import VehicleFleet, VehicleSimulator
+from waveform import Waveform
+from writers import AsyncFrameWriter, BinaryFrameWriter, CsvFrameWriter
+
+# benchmark cases of the full and of the quick (--suite quick) suite
+SUITES = {
+    'full': {
+        'points': [10, 100, 1000],
+        'objects': [10, 100, 1000, 10000],
+        'chirps': [(150, 1000), (64, 1000), (150, 256)],
+        'writers': ['binary', 'async', 'csv'],
+    },
+    'quick': {
+        'points': [10, 100],
+        'objects': [10, 100],
+        'chirps': [(150, 1000), (64, 256)],
+        'writers': ['binary', 'csv'],
+    },
+}
+
+
+def make_radar(n_r=150, n_s=1000):
+    # radar with n_r chirps of n_s samples, the sample rate follows n_s
+    waveform = Waveform(n_r=n_r, n_s=n_s)
+    return Fmcw(0, 0, 0, 0, 90, 0, 0, False, waveform=waveform)
+
+
+def make_points(radar, n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    radar.dist_dots = rng.uniform(1, 100, n_points)
+    radar.rad_v_dots = rng.uniform(-15, 15, n_points)
+    radar.angle_dots = rng.uniform(-radar.max_angle, radar.max_angle, n_points)
+
+
+def make_fleet(n_objects, d, seed=0):
+    # objects in front of the radar spread over a 200 x 200 m area
+    rng = np.random.default_rng(seed)
+    n = n_objects
+    return VehicleFleet(rng.uniform(-100, 100, n), rng.uniform(1, 200, n), rng.uniform(0, 10, n),
+                        np.full(n, 15.0), rng.uniform(-180, 180, n), rng.uniform(-1, 1, n),
+                        rng.uniform(-0.1, 0.1, n), rng.choice([1.8, 2.0], n), rng.choice([4.0, 4.5], n), d)
+
+
+def measure(fn, repeat):
+    # median and minimum wall time and the peak of the traced allocations
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = timer.perf_counter()
+        fn()
+        times.append(timer.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return float(np.median(times)), float(np.min(times)), peak
+
+
+def bench_cases(suite):
+    # (name, params, function, frames per call, points per call)
+    cases = []
+    for n_r, n_s in suite['chirps']:
+        for n_points in suite['points']:
+            radar = make_radar(n_r, n_s)
+            make_points(radar, n_points)
+            params = {'n_r': n_r, 'n_s': n_s, 'points': n_points}
+            cases.append(('synthesis', params,
+                          lambda r=radar: r.synthesize_chirps(r.dist_dots, r.rad_v_dots), 1, n_points))
+            cases.append(('velocity_range_map', params,
+                          lambda r=radar: r.velocity_range_map(r.dist_dots, r.rad_v_dots), 1, n_points))
+            cases.append(('angle_range_map', params,
+                          lambda r=radar: r.angle_range_map(r.angle_dots, r.dist_dots, r.rad_v_dots), 1, n_points))
+            analytic = make_radar(n_r, n_s)
+            make_points(analytic, n_points)
+            analytic.synthesis_mode = 'analytic'
+            cases.append(('analytic_maps', params,
+                          lambda r=analytic: (r.velocity_range_map(r.dist_dots, r.rad_v_dots),
+                                              r.angle_range_map(r.angle_dots, r.dist_dots, r.rad_v_dots)),
+                          1, n_points))
+        radar = make_radar(n_r, n_s)
+        table = np.random.default_rng(0).standard_normal((n_r, n_s))
+        cases.append(('range_doppler_fft', {'n_r': n_r, 'n_s': n_s},
+                      lambda r=radar, t=table: r.range_doppler_map(t), 1, 0))
+
+    radar = make_radar()
+    for n_objects in suite['objects']:
+        fleet = make_fleet(n_objects, radar.d)
+        n_points = fleet.visible_coords.shape[0]
+        params = {'objects': n_objects}
+        cases.append(('fleet_update', params, lambda f=fleet: f.update(0.01), 1, n_points))
+        cases.append(('scene_points', params,
+                      lambda f=fleet: scene.update_radar_points(radar, f), 1, n_points))
+        if n_objects <= 1000:
+            vehs = [VehicleSimulator(fleet.x[i], fleet.y[i], fleet.v[i], fleet.max_v[i],
+                                     np.rad2deg(fleet.yaw[i]), fleet.a[i], fleet.omega[i],
+                                     fleet.W[i], fleet.L[i], radar.d) for i in range(n_objects)]
+            cases.append(('vehicle_simulator_update', params,
+                          lambda vs=vehs: [veh.update(0.01) for veh in vs], 1, n_points))
+    return cases
+
+
+def bench_writers(suite, n_frames=20):
+    # writing n_frames maps of the default size with every writer
+    radar = make_radar()
+    make_points(radar, 10)
+    velocity_table = np.abs(radar.velocity_range_map(radar.dist_dots, radar.rad_v_dots))
+    angle_table = radar.angle_range_map(radar.angle_dots, radar.dist_dots, radar.rad_v_dots)
+    ranges, velocities = radar.range_axis(), radar.velocity_axis()
+    writers = {
+        'binary': BinaryFrameWriter,
+        'async': lambda path: AsyncFrameWriter(BinaryFrameWriter(path)),
+        'csv': CsvFrameWriter,
+    }
+
+    def run(make_writer):
+        path = tempfile.mkdtemp(prefix='fmcw-bench-')
+        try:
+            writer = make_writer(path)
+            for i in range(n_frames):
+                writer.write('vel-rad', i*0.1, velocity_table, velocities, ranges)
+                writer.write('azim-rad', i*0.1, angle_table, radar.angles, ranges)
+            writer.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    cases = []
+    for name in suite['writers']:
+        cases.append(('writer', {'writer': name, 'frames': n_frames},
+                      lambda w=writers[name]: run(w), n_frames, 0))
+    return cases
+
+
+def run_benchmarks(suite='full', repeat=5, progress=True):
+    suite = SUITES[suite]
+    results = []
+    for name, params, fn, frames, points in bench_cases(suite) + bench_writers(suite):
+        median, best, peak = measure(fn, repeat)
+        result = {
+            'name': name,
+            'params': params,
+            'time': median,
+            'min_time': best,
+            'peak_memory': peak,
+            'frames_per_second': frames / median if median > 0 else 0.0,
+            'points_per_second': points / median if median > 0 else 0.0,
+        }
+        results.append(result)
+        if progress:
+            print('%-25s %-45s %10.3f мс %10.1f МБ' % (name, json.dumps(params), median*1e3, peak/2**20),
+                  flush=True)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'date': timer.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def _key(result):
+    return result['name'] + ' ' + json.dumps(result['params'], sort_keys=True)
+
+
+def compare(report, baseline, tolerance=0.2):
+    # cases that got slower than the baseline by more than tolerance
+    base = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = base.get(_key(result))
+        if old is not None and result['time'] > old['time'] * (1 + tolerance):
+            regressions.append((_key(result), old['time'], result['time']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности моделирования и обработки сигналов")
+    parser.add_argument('--suite', choices=sorted(SUITES), default='full')
+    parser.add_argument('--repeat', type=int, default=5, help="число повторов каждого замера")
+    parser.add_argument('--output', default='bench_results.json', help="файл для результатов")
+    parser.add_argument('--baseline', help="файл с результатами предыдущего запуска для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="допустимое относительное замедление по сравнению с baseline")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.suite, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for key, old, new in regressions:
+            print('Замедление %s: %.3f мс -> %.3f мс' % (key, old*1e3, new*1e3))
+        if regressions:
+            return 1
+        print('Замедлений по сравнению с %s нет' % args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import tempfile
+import time as timer
+
+import numpy as np
+
+import profiling
+
+
+def _jsonable(value):
+    # arrays (windows, angles) enter the key through the hash of their data
+    if isinstance(value, np.ndarray):
+        return 'array:%s:%s:%s' % (value.dtype.str, value.shape,
+                                   hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, np.generic):
+        return value.item()
+    return repr(value)
+
+
+def frame_key(kind, config, points, resolution):
+    # hash of the map type, the radar configuration and the points quantized
+    # to resolution. The points are sorted, so their order does not matter
+    columns = [np.round(np.asarray(p, dtype=np.float64).ravel() / resolution).astype(np.int64)
+               for p in points]
+    if columns and columns[0].size:
+        order = np.lexsort(columns[::-1])
+        columns = [col[order] for col in columns]
+    h = hashlib.sha1()
+    h.update(json.dumps({'kind': kind, 'config': config, 'resolution': resolution},
+                        sort_keys=True, default=_jsonable).encode())
+    for col in columns:
+        h.update(np.int64(col.size).tobytes())
+        h.update(col.tobytes())
+    return h.hexdigest()
+
+
+class FrameCache:
+    # content-addressed on-disk cache of the maps of a tick. Every map is an
+    # .npy file named by its key; when the files get larger than max_bytes
+    # the least recently used ones are removed. Several processes can share
+    # the directory: the index of a process is scanned again when the
+    # directory was changed by another process since its last write, before
+    # evicting and for stats(), and a file removed by another process is
+    # just a miss
+    def __init__(self, path, max_bytes=2**30, resolution=1e-6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.resolution = resolution
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self._scan()
+
+    def _dir_mtime(self):
+        # changes when files are added to or removed from the directory
+        return os.stat(self.path).st_mtime_ns
+
+    def _scan(self):
+        # key -> [size, last use] of the maps on disk, the last use is the
+        # modification time, which get() updates
+        self._mtime = self._dir_mtime()
+        self.index = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.npy'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                self.index[entry.name[:-4]] = [st.st_size, st.st_mtime]
+        self.size = sum(size for size, _ in self.index.values())
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npy')
+
+    def get(self, key):
+        try:
+            table = np.load(self._file(key))
+        except (IOError, ValueError):
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            return None
+        now = timer.time()
+        try:
+            os.utime(self._file(key), (now, now))
+        except OSError:
+            pass
+        if key not in self.index:
+            # stored by another process
+            self.index[key] = [os.path.getsize(self._file(key)), now]
+            self.size += self.index[key][0]
+        self.index[key][1] = now
+        return table
+
+    def put(self, key, table):
+        # the file is renamed into place, so readers never see a partial map
+        changed = self._dir_mtime() != self._mtime
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp, self._file(key))
+        if changed:
+            # other processes have written or removed maps since the last write
+            self._scan()
+        else:
+            size = os.path.getsize(self._file(key))
+            old = self.index.get(key)
+            self.size += size - (old[0] if old else 0)
+            self.index[key] = [size, timer.time()]
+            self._mtime = self._dir_mtime()
+        if self.size > self.max_bytes:
+            if not changed:
+                self._scan()
+            self._evict()
+            self._mtime = self._dir_mtime()
+
+    def _evict(self):
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            del self.index[key]
+            self.size -= size
+
+    def get_or_compute(self, kind, config, points, compute):
+        key = frame_key(kind, config, points, self.resolution)
+        table = self.get(key)
+        if table is not None:
+            self.hits += 1
+            profiling.count('cache_hits')
+            return table
+        self.misses += 1
+        profiling.count('cache_misses')
+        table = compute()
+        self.put(key, table)
+        return table
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        self._scan()
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(),
+                'size': self.size, 'entries': len(self.index)}
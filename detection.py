@@ -0,0 +1,125 @@
+import numpy as np
+from scipy import ndimage
+
+# one radar detection, snr is in dB
+DETECTION_DTYPE = np.dtype([
+    ('range', np.float32),
+    ('velocity', np.float32),
+    ('azimuth', np.float32),
+    ('snr', np.float32),
+])
+
+
+def _pad(x, pad):
+    # the Doppler axis (rows) is circular, the range axis (columns) is not
+    x = np.pad(x, ((pad[0], pad[0]), (0, 0)), mode='wrap')
+    return np.pad(x, ((0, 0), (pad[1], pad[1])), mode='symmetric')
+
+
+def _box_sum(padded, pad, half):
+    # sums over the (2*half + 1) boxes centered on the cells of the map,
+    # padded is the map padded by pad >= half cells with _pad
+    s = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+    s[1:, 1:] = padded.cumsum(0).cumsum(1)
+    n0 = padded.shape[0] - 2*pad[0]
+    n1 = padded.shape[1] - 2*pad[1]
+    r0, c0 = pad[0] - half[0], pad[1] - half[1]
+    r1, c1 = r0 + 2*half[0] + 1, c0 + 2*half[1] + 1
+    return (s[r1:r1 + n0, c1:c1 + n1] - s[r0:r0 + n0, c1:c1 + n1]
+            - s[r1:r1 + n0, c0:c0 + n1] + s[r0:r0 + n0, c0:c0 + n1])
+
+
+def _n_train(guard, train):
+    outer = (2*(guard[0] + train[0]) + 1) * (2*(guard[1] + train[1]) + 1)
+    return outer - (2*guard[0] + 1) * (2*guard[1] + 1)
+
+
+def ca_scale(n_train, pfa):
+    # threshold factor of CA-CFAR for a square-law detector
+    return n_train * (pfa ** (-1.0/n_train) - 1)
+
+
+def ca_cfar(power, guard=(2, 2), train=(8, 8)):
+    # mean power of the training cells around every cell of the map,
+    # guard and train are the (Doppler, range) half-widths in cells
+    outer = (guard[0] + train[0], guard[1] + train[1])
+    padded = _pad(power, outer)
+    noise = _box_sum(padded, outer, outer) - _box_sum(padded, outer, guard)
+    return noise / _n_train(guard, train)
+
+
+def os_cfar(power, guard=(2, 2), train=(8, 8), rank=0.75):
+    # rank-th fraction of the ordered training cells around every cell
+    outer = (guard[0] + train[0], guard[1] + train[1])
+    footprint = np.ones((2*outer[0] + 1, 2*outer[1] + 1), dtype=bool)
+    footprint[train[0]:train[0] + 2*guard[0] + 1, train[1]:train[1] + 2*guard[1] + 1] = False
+    k = min(int(rank * footprint.sum()), footprint.sum() - 1)
+    noise = ndimage.rank_filter(_pad(power, outer), k, footprint=footprint, mode='constant')
+    return noise[outer[0]:outer[0] + power.shape[0], outer[1]:outer[1] + power.shape[1]]
+
+
+def group_peaks(mask, power):
+    # flat indices of the strongest cell of every connected group of
+    # detected cells (8-connectivity)
+    labels, n = ndimage.label(mask, structure=np.ones((3, 3)))
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.flatnonzero(labels)
+    lab = labels.ravel()[idx]
+    order = np.lexsort((-power.ravel()[idx], lab))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = lab[order][1:] != lab[order][:-1]
+    return idx[order[first]]
+
+
+class CfarDetector:
+    # 2D CFAR over the range-Doppler map, the azimuth of a detection is the
+    # peak of its range bin in the azimuth-range map. method is 'ca' or 'os'
+    def __init__(self, method='ca', guard=(2, 2), train=(8, 8), pfa=1e-6, rank=0.75, scale=None,
+                 noise_floor=1e-6):
+        self.method = method
+        self.guard = tuple(guard)
+        self.train = tuple(train)
+        self.pfa = pfa
+        self.rank = rank
+        # threshold factor, by default derived from pfa with the CA-CFAR
+        # formula (an approximation for OS-CFAR)
+        self.scale = scale if scale is not None else ca_scale(_n_train(self.guard, self.train), pfa)
+        # the simulated maps have no thermal noise, the noise estimate is
+        # at least noise_floor times the peak power of the map (-60 dB), so
+        # the rounding errors of the FFT and of the sums are not detected
+        self.noise_floor = noise_floor
+
+    def noise(self, power):
+        if self.method == 'ca':
+            return ca_cfar(power, self.guard, self.train)
+        if self.method == 'os':
+            return os_cfar(power, self.guard, self.train, self.rank)
+        raise ValueError("Неизвестный метод CFAR: %s" % self.method)
+
+    def detect(self, velocity_table, angle_table, ranges, velocities, angles):
+        power = np.abs(velocity_table).astype(np.float64)**2
+        noise = np.maximum(self.noise(power), self.noise_floor * power.max(initial=0.0))
+        mask = (power > self.scale * noise) & (noise > 0)
+        peaks = group_peaks(mask, power)
+        rows, cols = np.unravel_index(peaks, power.shape)
+
+        detections = np.zeros(peaks.size, dtype=DETECTION_DTYPE)
+        detections['range'] = np.asarray(ranges)[cols]
+        detections['velocity'] = np.asarray(velocities)[rows]
+        if angle_table is not None:
+            detections['azimuth'] = np.asarray(angles)[np.argmax(angle_table[:, cols], axis=0)]
+        else:
+            detections['azimuth'] = np.nan
+        detections['snr'] = 10*np.log10(power[rows, cols] / noise[rows, cols])
+        return detections
+
+
+def match_ground_truth(detections, dist_dots, rad_v_dots, angle_dots,
+                       range_tol=1.0, velocity_tol=1.0, azimuth_tol=3.0):
+    # for every detection whether a ground-truth point lies within the
+    # tolerances, and for every point whether it was detected
+    near = ((np.abs(detections['range'][:, None] - np.asarray(dist_dots)[None, :]) <= range_tol)
+            & (np.abs(detections['velocity'][:, None] - np.asarray(rad_v_dots)[None, :]) <= velocity_tol)
+            & (np.abs(detections['azimuth'][:, None] - np.asarray(angle_dots)[None, :]) <= azimuth_tol))
+    return near.any(axis=1), near.any(axis=0)
@@ -0,0 +1,150 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft as sp_fft
+from scipy.signal import get_window as sp_get_window
+
+
+@lru_cache(maxsize=64)
+def _named_window(window, n):
+    w = sp_get_window(window, n, fftbins=False)
+    w.setflags(write=False)
+    return w
+
+
+def get_window(window, n):
+    # window can be None (rectangular), a scipy window name/tuple or an array,
+    # named windows are computed once per length
+    if window is None:
+        return None
+    if isinstance(window, (str, tuple)):
+        return _named_window(window, n)
+    window = np.asarray(window, dtype=np.float64)
+    if window.shape != (n,):
+        raise ValueError("Длина окна %d не совпадает с длиной сигнала %d" % (window.size, n))
+    return window
+
+
+def _apply_window(x, window, axis):
+    n = x.shape[axis]
+    w = get_window(window, n)
+    if w is None:
+        return x, 2.0/n
+    shape = [1] * x.ndim
+    shape[axis] = n
+    # amplitude is normalized by the coherent gain of the window
+    return x * w.reshape(shape), 2.0/w.sum()
+
+
+def _kernel_table(w, n, oversample):
+    # K(δ)*exp(-iπδ(n-1)) on the grid δ = -0.5 ... 0.5 with step 1/(n*oversample),
+    # without the linear phase the kernel of a symmetric window is smooth
+    size = n * oversample
+    k = sp_fft.ifft(np.ones(n) if w is None else w, size) * size
+    k = np.fft.fftshift(k)
+    delta = np.arange(-(size//2), size - size//2) / size
+    table = np.empty(size + 1, dtype=np.complex128)
+    table[:size] = k * np.exp(-1j*np.pi*delta*(n - 1))
+    # K is periodic in δ, the phase factor changes sign with n - 1
+    table[size] = table[0] * (-1)**(n - 1)
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=16)
+def _named_kernel_table(window, n, oversample):
+    return _kernel_table(get_window(window, n), n, oversample)
+
+
+def window_kernel(window, n, delta, oversample=64):
+    # K(δ) = sum_k w_k exp(2πiδk): spectrum of the window of n samples at
+    # δ cycles per sample, which spreads a tone over the neighbouring FFT
+    # bins. Interpolated from a table that is cached per window and length
+    if window is None or isinstance(window, (str, tuple)):
+        table = _named_kernel_table(window, n, oversample)
+    else:
+        table = _kernel_table(get_window(window, n), n, oversample)
+    size = table.size - 1
+    delta = np.asarray(delta, dtype=np.float64)
+    delta = delta - np.round(delta)
+    x = (delta + 0.5) * size
+    i = np.clip(np.floor(x).astype(np.int64), 0, size - 1)
+    frac = x - i
+    k = table[i] * (1 - frac) + table[i + 1] * frac
+    return k * np.exp(1j*np.pi*delta*(n - 1))
+
+
+def window_scale(window, n):
+    # amplitude normalization of the FFT with the window, see _apply_window
+    w = get_window(window, n)
+    return 2.0/n if w is None else 2.0/w.sum()
+
+
+def range_fft(table, window=None, n_fft=None, real=True, dtype=np.complex64, workers=None):
+    # FFT of every chirp (last axis), only the positive frequencies are kept
+    table = np.asarray(table)
+    n_fft = n_fft or table.shape[-1]
+    x, scale = _apply_window(table, window, -1)
+    if real and not np.iscomplexobj(x):
+        spectrum = sp_fft.rfft(x, n=n_fft, axis=-1, workers=workers)
+    else:
+        spectrum = sp_fft.fft(x, n=n_fft, axis=-1, workers=workers)
+    spectrum = spectrum[..., :n_fft//2]
+    spectrum *= scale
+    return spectrum.astype(dtype, copy=False)
+
+
+def doppler_fft(range_table, window=None, n_fft=None, dtype=np.complex64, workers=None):
+    # FFT of every range bin over the chirps (first axis)
+    range_table = np.asarray(range_table)
+    n_fft = n_fft or range_table.shape[0]
+    x, scale = _apply_window(range_table, window, 0)
+    spectrum = sp_fft.fft(x, n=n_fft, axis=0, workers=workers)
+    spectrum *= scale
+    return spectrum.astype(dtype, copy=False)
+
+
+def range_doppler_map(table, range_window=None, doppler_window=None, n_range_fft=None,
+                      n_doppler_fft=None, real=True, dtype=np.complex64, workers=None):
+    # 2D FFT of the (n_r, n_s) chirp matrix into a (n_doppler_fft, n_range_fft//2) map
+    range_table = range_fft(table, range_window, n_range_fft, real, dtype, workers)
+    return doppler_fft(range_table, doppler_window, n_doppler_fft, dtype, workers)
+
+
+def range_bins(n_fft, f_s):
+    # beat frequencies of the n_fft//2 range FFT bins of the maps
+    return np.fft.rfftfreq(n_fft, 1/f_s)[:n_fft//2]
+
+
+def doppler_bins(n_fft, f_chirp):
+    # angular frequencies of the Doppler FFT bins in the FFT order, for an odd
+    # n_fft there is one more positive bin than the even split gives
+    return np.fft.fftfreq(n_fft)*f_chirp*2*np.pi
+
+
+def steering_matrix(n_channels, spacing, angles):
+    # (n_angles, n_channels) steering vectors of a uniform linear array,
+    # spacing is the element spacing in wavelengths, angles are in degrees
+    u = np.sin(np.deg2rad(angles))
+    return np.exp(2j*np.pi*spacing*u[:, None]*np.arange(n_channels)[None, :])
+
+
+def beamform(channels, spacing, angles, method='fft', n_fft=256, dtype=np.complex64, workers=None):
+    # azimuth spectrum over the channel axis (first axis) of channels sampled
+    # at the given angles, the result has shape (len(angles),) + channels.shape[1:]
+    channels = np.asarray(channels)
+    n_channels = channels.shape[0]
+    if method == 'bartlett':
+        a = steering_matrix(n_channels, spacing, angles)
+        spectrum = np.tensordot(a.conj(), channels, axes=(1, 0))
+    elif method == 'fft':
+        n_fft = max(n_fft, n_channels)
+        spectrum = sp_fft.fft(channels, n=n_fft, axis=0, workers=workers)
+        # nearest angle FFT bin of every requested angle
+        u = np.sin(np.deg2rad(angles))
+        bins = np.round(n_fft*spacing*u).astype(np.int64) % n_fft
+        spectrum = spectrum[bins]
+    else:
+        raise ValueError("Неизвестный метод оценки азимута: %s" % method)
+    spectrum /= n_channels
+    return spectrum.astype(dtype, copy=False)
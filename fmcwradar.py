@@ -1,10 +1,37 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-from scipy.fftpack import fft
 import numpy as np
 
+from synthesis import analytic_range_doppler, analytic_range_spectrum, beat_tones, synthesize, MAX_CHUNK_BYTES
+import dsp
+import profiling
+from vehicle import advance
+from waveform import Waveform
+from writers import NullFrameWriter
+
+
+def _waveform_param(name, settable=True):
+    # radar attribute backed by the waveform, setting it replaces the waveform
+    def get(self):
+        return getattr(self.waveform, name)
+
+    def set(self, value):
+        self.waveform = self.waveform.replace(**{name: value})
+    return property(get, set if settable else None)
+
+
 class Fmcw:
-    def __init__(self, x, y, v, max_v, yaw, a, omega, show_animation, ar_path, vr_path):
+    c = _waveform_param('c', False)
+    f_0 = _waveform_param('f_0')
+    f_r = _waveform_param('f_r')
+    f_chirp = _waveform_param('f_chirp')
+    n_r = _waveform_param('n_r')
+    f_s = _waveform_param('f_s')
+    n_s = _waveform_param('n_s')
+    T_r = _waveform_param('T_r', False)
+    m_w = _waveform_param('m_w', False)
+    T_M = _waveform_param('T_M', False)
+    d = _waveform_param('d', False)
+
+    def __init__(self, x, y, v, max_v, yaw, a, omega, show_animation, writer=None, waveform=None):
         self.x = float(x)
         self.y = float(y)
         self.v = float(v)
@@ -12,166 +39,277 @@ class Fmcw:
         self.omega = float(omega)
         self.max_v = float(max_v)
         self.yaw = np.deg2rad(float(yaw))
+        # the scene and the maps are shown by the LiveView of run_simulation
         self.show_animation = show_animation
-        self.ar_path = ar_path
-        self.vr_path = vr_path
-
-        self.c = 299792458
-
-        self.angle_dots = [] 
-        self.dist_dots = []
-        self.rad_v_dots = []
-
-        # chirp sequence frequency
-        self.f_chirp = 50*1e3 #Hz
-
-        # ramp frequency
-        self.f_r = 200*1e6 #Hz
-        self.T_r = 1/self.f_chirp # duration of one cycle
-        self.m_w = self.f_r/self.T_r
-
-        self.n_r = 150 # number of chirps
-        self.T_M = self.T_r*self.n_r
-
-        self.f_s = 50e6 #50 MHz
-        self.n_s = int(self.T_r*self.f_s)
-
-        self.f_0 = 77.7*1e9
-
-        self.d = self.c / (8 * self.f_r)
+        # receives the maps of every tick
+        self.writer = writer if writer is not None else NullFrameWriter()
+        # the maps can be left out when only the detections are needed
+        self.store_maps = True
+        # CfarDetector that extracts the targets from the maps of every tick
+        self.detector = None
+        self.velocity_table = None
+        self.angle_table = None
+        # FrameCache that returns the maps of ticks that were computed before
+        self.cache = None
+
+        # chirp sequence parameters (f_0, f_r, f_chirp, n_r, f_s, n_s) with the
+        # time base and the axes cached per configuration
+        self.waveform = waveform if waveform is not None else Waveform()
+
+        # azimuths (°), ranges (m) and radial velocities (m/s) of the visible points
+        self.angle_dots = np.empty(0)
+        self.dist_dots = np.empty(0)
+        self.rad_v_dots = np.empty(0)
+
+        # memory limit for the temporary arrays of the signal synthesis
+        self.max_chunk_bytes = MAX_CHUNK_BYTES
+        # 'time' synthesizes the sampled signal of every point, 'analytic' adds
+        # the spectrum of every point to the analytic_kernel + 1 nearest bins
+        # of each axis, see synthesis_fidelity for the difference
+        self.synthesis_mode = 'time'
+        self.analytic_kernel = 8
+
+        # range-Doppler processing: windows (None is rectangular), FFT sizes
+        # for zero-padding (None is no padding) and the dtype of the maps
+        self.range_window = None
+        self.doppler_window = None
+        self.n_range_fft = None
+        self.n_doppler_fft = None
+        self.map_dtype = np.complex64
+        self.fft_workers = None
+
+        # field of view and azimuth bins of the azimuth-range map (°)
+        self.max_angle = 80
+
+        # visibility of the points: max_range limits the range (None is the
+        # largest range of the range axis), with occlusion only the nearest
+        # object is seen in every occlusion_bin (°) of azimuth
+        self.max_range = None
+        self.occlusion = True
+        self.occlusion_bin = 0.25
+
+        # azimuth estimation: 'bins' groups the points by their geometric
+        # azimuth, 'array' simulates a virtual uniform linear array of
+        # n_tx*n_rx channels and estimates the azimuth with a beamformer
+        self.angle_mode = 'bins'
+        self.n_tx = 1
+        self.n_rx = 8
+        self.element_spacing = None # None is half the wavelength of the waveform
+        self.beamformer = 'fft' # 'fft' or 'bartlett'
+        self.n_angle_fft = 256
 
     def update(self, dt):
-        self.x += self.v * np.cos(self.yaw)  * dt
-        self.y += self.v * np.sin(self.yaw)*  dt
-        self.yaw += self.omega * dt
-        self.v += self.a * dt
-        if self.v >= self.max_v:
-            self.v = self.max_v
-
-    def get_range(self, t, r, v):
-        return r+v*t
-
-    def itr(self, t, ri, vi):
-        r = self.get_range(t, ri, vi)
-        w_itr = 2*self.f_0*vi/self.c + 2*self.m_w*r/self.c
-        # we do t%T_r because the eq. above only valid within the ramp
-        v = np.cos(2*np.pi*w_itr*(t%self.T_r) + 2*r*2*np.pi*self.f_0/self.c)
-        return v
-
-    def sum_v(self, chirp_nr):
-        v = 0
-        for i in range(len(self.dist_dots)):
-            v += self.arr_v_sample[i][(chirp_nr*self.n_s):(self.n_s*(chirp_nr+1))]
-        return v
-
-    def sum_v_for_a(self, indexes):
-        v = 0
-        for i in range(0, len(indexes)):
-            v += self.arr_v_sample[i][0:self.n_s]
-        return v
+        with profiling.stage('kinematics'):
+            self.x, self.y, self.yaw, self.v = advance(
+                self.x, self.y, self.yaw, self.v, self.a, self.omega, self.max_v, dt)
+
+    def synthesize_chirps(self, dist_dots, rad_v_dots):
+        # summed beat signal of all points as a (n_r, n_s) chirp matrix
+        v = synthesize(self.waveform.t_sample, self.waveform.t_ramp, dist_dots, rad_v_dots,
+                       self.f_0, self.m_w, self.c, max_chunk_bytes=self.max_chunk_bytes)
+        return v.reshape(self.n_r, self.n_s)
+
+    def synthesize_angle_chirps(self, angle_dots, dist_dots, rad_v_dots):
+        # summed first chirp of the points of every azimuth bin, (n_angles, n_s)
+        angle_idx = np.round(np.asarray(angle_dots, dtype=np.float64)).astype(np.int64) - self.angles[0]
+        valid = (angle_idx >= 0) & (angle_idx < self.angles.size)
+        onehot = np.zeros((self.angles.size, angle_idx.size))
+        onehot[angle_idx[valid], np.flatnonzero(valid)] = 1.0
+        # only the samples of the first chirp are needed for the range FFT
+        n = self.n_s
+        return synthesize(self.waveform.t_sample[:n], self.waveform.t_ramp[:n], dist_dots, rad_v_dots,
+                          self.f_0, self.m_w, self.c, weights=onehot,
+                          max_chunk_bytes=self.max_chunk_bytes)
+
+    def array_spacing(self):
+        # element spacing of the virtual array (m)
+        if self.element_spacing is None:
+            return self.waveform.wavelength / 2
+        return self.element_spacing
+
+    def channel_phases(self, angle_dots):
+        # (n_channels, n_points) phase shifts of the point signals at the
+        # virtual array elements, TX and RX positions add up to k*spacing
+        positions = np.arange(self.n_tx*self.n_rx) * self.array_spacing()
+        u = np.sin(np.deg2rad(np.asarray(angle_dots, dtype=np.float64)))
+        return 2*np.pi*self.f_0/self.c * positions[:, None] * u[None, :]
+
+    def synthesize_channel_chirps(self, angle_dots, dist_dots, rad_v_dots, n_chirps=1):
+        # summed signal of every virtual channel over the first n_chirps chirps
+        weights = np.exp(1j*self.channel_phases(angle_dots))
+        n = n_chirps*self.n_s
+        return synthesize(self.waveform.t_sample[:n], self.waveform.t_ramp[:n], dist_dots, rad_v_dots,
+                          self.f_0, self.m_w, self.c, weights=weights,
+                          max_chunk_bytes=self.max_chunk_bytes)
+
+    def range_doppler_map(self, table):
+        with profiling.stage('range_doppler_fft'):
+            return dsp.range_doppler_map(table, self.range_window, self.doppler_window,
+                                         self.n_range_fft, self.n_doppler_fft,
+                                         dtype=self.map_dtype, workers=self.fft_workers)
+
+    def visible_range(self):
+        if self.max_range is not None:
+            return self.max_range
+        return self.freq_to_range(self.f_s / 2)
 
     def freq_to_range(self, f):
-        return f*self.c/(2*self.m_w)
+        return self.waveform.freq_to_range(f)
 
     def angle_freq_to_velocity(self, w):
-        return w*self.c/(4*np.pi*self.f_0)
+        return self.waveform.angle_freq_to_velocity(w)
+
+    @property
+    def angles(self):
+        # azimuth bins (°) of the azimuth-range map, follow max_angle
+        return np.arange(-self.max_angle, self.max_angle + 1, 1)
+
+    def range_axis(self):
+        return self.waveform.range_axis(self.n_range_fft)
+
+    def velocity_axis(self):
+        return self.waveform.velocity_axis(self.n_doppler_fft)
+
+    def beat_tones(self, dist_dots, rad_v_dots, n_chirps):
+        w = self.waveform
+        return beat_tones(dist_dots, rad_v_dots, w.dt, w.n_s, n_chirps, w.T_r, w.f_0, w.m_w, w.c)
+
+    def analytic_angle_range_map(self, angle_dots, dist_dots, rad_v_dots):
+        # angle_range_map of the first chirp without the time domain signal
+        phase0, fast, _ = self.beat_tones(dist_dots, rad_v_dots, 1)
+        kwargs = dict(n_fft=self.n_range_fft, window=self.range_window, kernel=self.analytic_kernel,
+                      dtype=self.map_dtype, max_chunk_bytes=self.max_chunk_bytes)
+        if self.angle_mode == 'array':
+            amplitude = np.exp(1j*(self.channel_phases(angle_dots) + phase0))
+            n_channels = amplitude.shape[0]
+            range_channels = analytic_range_spectrum(
+                amplitude, np.tile(fast, n_channels), np.repeat(np.arange(n_channels), fast.size),
+                n_channels, self.n_s, **kwargs)
+            with profiling.stage('angle_fft'):
+                return np.abs(dsp.beamform(range_channels, self.array_spacing()/self.waveform.wavelength,
+                                           self.angles, self.beamformer, self.n_angle_fft,
+                                           dtype=self.map_dtype, workers=self.fft_workers))
+        angle_idx = np.round(np.asarray(angle_dots, dtype=np.float64)).astype(np.int64) - self.angles[0]
+        valid = (angle_idx >= 0) & (angle_idx < self.angles.size)
+        return np.abs(analytic_range_spectrum(np.exp(1j*phase0[valid]), fast[valid], angle_idx[valid],
+                                              self.angles.size, self.n_s, **kwargs))
+
+    def analytic_velocity_range_map(self, dist_dots, rad_v_dots):
+        phase0, fast, slow = self.beat_tones(dist_dots, rad_v_dots, self.n_r)
+        return analytic_range_doppler(np.exp(1j*phase0), fast, slow, self.n_s, self.n_r,
+                                      self.n_range_fft, self.n_doppler_fft, self.range_window,
+                                      self.doppler_window, self.analytic_kernel, self.map_dtype,
+                                      self.max_chunk_bytes)
+
+    def angle_range_map(self, angle_dots, dist_dots, rad_v_dots):
+        # |azimuth-range map| of the points, (n_angles, n_range_fft//2)
+        if self.synthesis_mode == 'analytic':
+            return self.analytic_angle_range_map(angle_dots, dist_dots, rad_v_dots)
+        if self.angle_mode == 'array':
+            samples = self.synthesize_channel_chirps(angle_dots, dist_dots, rad_v_dots)
+            with profiling.stage('angle_fft'):
+                range_channels = dsp.range_fft(samples, self.range_window, self.n_range_fft,
+                                               dtype=self.map_dtype, workers=self.fft_workers)
+                return np.abs(dsp.beamform(range_channels, self.array_spacing()/self.waveform.wavelength,
+                                           self.angles, self.beamformer, self.n_angle_fft,
+                                           dtype=self.map_dtype, workers=self.fft_workers))
+        samples = self.synthesize_angle_chirps(angle_dots, dist_dots, rad_v_dots)
+        with profiling.stage('angle_fft'):
+            return np.abs(dsp.range_fft(samples, self.range_window, self.n_range_fft,
+                                        dtype=self.map_dtype, workers=self.fft_workers))
+
+    def velocity_range_map(self, dist_dots, rad_v_dots):
+        # complex range-Doppler map of the points, (n_doppler_fft, n_range_fft//2)
+        if self.synthesis_mode == 'analytic':
+            return self.analytic_velocity_range_map(dist_dots, rad_v_dots)
+        return self.range_doppler_map(self.synthesize_chirps(dist_dots, rad_v_dots))
+
+    def synthesis_fidelity(self, angle_dots, dist_dots, rad_v_dots):
+        # difference of the map magnitudes of the analytic mode from the time
+        # domain ones: relative rms error, largest error relative to the peak
+        # and whether the peak is in the same cell
+        maps = {}
+        mode = self.synthesis_mode
+        try:
+            for self.synthesis_mode in ('time', 'analytic'):
+                maps[self.synthesis_mode] = (np.abs(self.velocity_range_map(dist_dots, rad_v_dots)),
+                                             self.angle_range_map(angle_dots, dist_dots, rad_v_dots))
+        finally:
+            self.synthesis_mode = mode
+        result = {}
+        for kind, exact, fast in zip(('vel-rad', 'azim-rad'), maps['time'], maps['analytic']):
+            exact, fast = exact.astype(np.float64), fast.astype(np.float64)
+            peak = max(exact.max(), 1e-30)
+            result[kind] = {
+                'rel_error': float(np.linalg.norm(fast - exact) / max(np.linalg.norm(exact), 1e-30)),
+                'max_error': float(np.abs(fast - exact).max() / peak),
+                'peak_match': bool(np.argmax(fast) == np.argmax(exact)),
+            }
+        return result
+
+    def map_config(self, kind):
+        # settings the map of the kind depends on, part of the cache key
+        config = {'waveform': self.waveform.params(), 'range_window': self.range_window,
+                  'n_range_fft': self.n_range_fft, 'map_dtype': np.dtype(self.map_dtype).str,
+                  'synthesis_mode': self.synthesis_mode}
+        if self.synthesis_mode == 'analytic':
+            config['analytic_kernel'] = self.analytic_kernel
+        if kind == 'vel-rad':
+            config.update(doppler_window=self.doppler_window, n_doppler_fft=self.n_doppler_fft)
+        else:
+            config.update(angles=self.angles, angle_mode=self.angle_mode)
+            if self.angle_mode == 'array':
+                config.update(n_tx=self.n_tx, n_rx=self.n_rx, spacing=self.array_spacing(),
+                              beamformer=self.beamformer, n_angle_fft=self.n_angle_fft)
+        return config
+
+    def cached_velocity_range_map(self, dist_dots, rad_v_dots, chirps=None):
+        # velocity_range_map, looked up in self.cache first when it is set.
+        # chirps already synthesized for the points are used in the time mode
+        if chirps is not None and self.synthesis_mode == 'time':
+            compute = lambda: self.range_doppler_map(chirps)
+        else:
+            compute = lambda: self.velocity_range_map(dist_dots, rad_v_dots)
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute('vel-rad', self.map_config('vel-rad'), (dist_dots, rad_v_dots), compute)
+
+    def cached_angle_range_map(self, angle_dots, dist_dots, rad_v_dots):
+        if self.cache is None:
+            return self.angle_range_map(angle_dots, dist_dots, rad_v_dots)
+        return self.cache.get_or_compute('azim-rad', self.map_config('azim-rad'),
+                                         (angle_dots, dist_dots, rad_v_dots),
+                                         lambda: self.angle_range_map(angle_dots, dist_dots, rad_v_dots))
+
+    def detect(self, velocity_table, angle_table):
+        with profiling.stage('detection'):
+            return self.detector.detect(velocity_table, angle_table, self.range_axis(),
+                                        self.velocity_axis(), self.angles)
+
+    def find_detections(self, time):
+        # detections in the last computed maps of the tick
+        detections = self.detect(self.velocity_table, self.angle_table)
+        self.writer.write_detections(time, detections)
+        return detections
 
     def find_angle_range_map(self, time):
-        angles = np.arange(-80, 81, 1)
-        angle_table = []
-        for a in angles:
-            indexes = [i for i,x in enumerate(self.angle_dots) if x == a]
-            
-            if len(indexes) != 0:
-                t_sample = np.linspace(0, self.T_M, self.n_r*self.n_s)
-                self.arr_v_sample = []
-                for i in indexes:
-                    self.arr_v_sample.append(self.itr(t_sample, self.dist_dots[i], self.rad_v_dots[i]))
-
-                samples = self.sum_v_for_a(indexes)
-
-                chirp_magnitude = fft(samples)
-
-                angle_table.append(2.0/self.n_s*np.abs(chirp_magnitude[0:self.n_s//2]))
-            else:
-                angle_table.append([0.0] * (self.n_s//2))
-
-        frequencies = np.arange(0, self.n_s//2)*self.f_s/self.n_s
-        ranges = np.around(self.freq_to_range(frequencies), decimals = 1)
-
-        table_a = pd.DataFrame(data=angle_table, 
-                                columns=["r = %.2f"%i for i in ranges], 
-                                index=["a = %.2f"%i for i in angles])
-                                
-        table_a.to_csv(self.ar_path + str(round(time, 1)) + 'sec.csv')
-
-        if self.show_animation:
-            plt.figure(3)
-            plt.cla()
-            plt.gcf().canvas.mpl_connect(
-                'key_release_event',
-                lambda event: [exit(0) if event.key == 'escape' else None])
-            plt.imshow(angle_table)
-            plt.xticks(range(ranges.size)[::20], ranges[::20], rotation=90);
-            plt.yticks(range(angles.size)[::10], angles[::10]);
-            plt.xlim([0, 200])
-            plt.xlabel("расстояние $r$ [m]")
-            plt.ylabel("азимут $θ$ [°]");
-            plt.title("Карта азимута-расстояния объектов")
+        angles = self.angles
+        angle_table = self.cached_angle_range_map(self.angle_dots, self.dist_dots, self.rad_v_dots)
+        ranges = self.range_axis()
+
+        self.angle_table = angle_table
+        if self.store_maps:
+            self.writer.write('azim-rad', time, angle_table, angles, ranges)
+
+        return angle_table
 
     def find_velocity_range_map(self, time):
-        t_sample = np.linspace(0, self.T_M, self.n_r*self.n_s)
-        self.arr_v_sample = []
-        for i in range(len(self.dist_dots)):
-            self.arr_v_sample.append(self.itr(t_sample, self.dist_dots[i], self.rad_v_dots[i]))
-
-        table = np.zeros((self.n_r, self.n_s))
-
-        for chirp_nr in range(self.n_r):
-            table[chirp_nr, :] = self.sum_v(chirp_nr)
-
-        table_df = pd.DataFrame(data=table, 
-                                columns=["sample_%03d"%i for i in range(self.n_s)], 
-                                index=["chirp_%03d"%i for i in range(self.n_r)])
-
-        table_df.head(10)
-
-        frequencies = np.arange(0, self.n_s//2)*self.f_s/self.n_s
-
-        ranges = np.around(self.freq_to_range(frequencies), decimals = 1)
-
-        range_table = np.zeros((self.n_r, self.n_s//2), dtype=np.csingle)
-
-        for chirp_nr in range(self.n_r):
-            chirp_ad_values = table_df.iloc[chirp_nr].values
-            chirp_fft = fft(chirp_ad_values) # FFT
-            range_table[chirp_nr, :] = 2.0/self.n_s*chirp_fft[:self.n_s//2]
-
-        velocity_table = np.zeros((self.n_r, range_table.shape[1]), dtype=np.csingle)
-        for r in range(range_table.shape[1]):
-            range_bin_magn = range_table[:, r]
-            range_bin_fft = fft(range_bin_magn)
-            velocity_table[:, r]= 2.0/self.n_r*range_bin_fft
-
-        omega_second = 2*np.pi*np.concatenate((np.arange(0, self.n_r//2), np.arange(-self.n_r//2, 0)[::1]))*self.f_chirp/self.n_r
-        velocities = np.around(self.angle_freq_to_velocity(omega_second), decimals = 1)
-        
-        table_v = pd.DataFrame(data=np.abs(velocity_table), 
-                                columns=["r = %.2f"%i for i in ranges], 
-                                index=["v = %.2f"%i for i in velocities])
-
-        table_v.to_csv(self.vr_path + str(round(time, 1)) + 'sec.csv')
-
-        if self.show_animation:
-            plt.figure(2)
-            plt.cla() 
-            plt.gcf().canvas.mpl_connect(
-                'key_release_event',
-                lambda event: [exit(0) if event.key == 'escape' else None])
-            plt.imshow(np.abs(velocity_table), cmap = plt.get_cmap('RdYlBu'))
-            plt.xticks(range(ranges.size)[::20], ranges[::20], rotation=90)
-            plt.yticks(range(velocities.size)[::10], velocities[::10])
-            plt.xlim([0, 200])
-            plt.xlabel("расстояние $r$ [m]")
-            plt.ylabel("скорость $v$ [m/s]");
-            plt.title("Карта скорости-расстояния объектов")
+        velocity_table = self.cached_velocity_range_map(self.dist_dots, self.rad_v_dots)
+        ranges = self.range_axis()
+        velocities = self.velocity_axis()
+
+        self.velocity_table = velocity_table
+        if self.store_maps:
+            self.writer.write('vel-rad', time, np.abs(velocity_table), velocities, ranges)
+
+        return velocity_table
@@ -1,31 +1,37 @@
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
-from scipy.fftpack import fft
 
+import dsp
+from scenario import load_waveform
+from waveform import Waveform
 
-c = 299792458
 
-# chirp sequence frequency
-f_chirp = 50*1e3 #Hz
+# the same chirp parameters as in the simulation
+if os.path.exists("waveform_input.txt"):
+    waveform = load_waveform("waveform_input.txt")
+else:
+    waveform = Waveform()
 
-# ramp frequency
-f_r = 200*1e6 #Hz
-T_r = 1/f_chirp # duration of one cycle
-S = f_r/T_r
+c = waveform.c
+f_chirp = waveform.f_chirp # chirp sequence frequency
+f_r = waveform.f_r # ramp frequency
+T_r = waveform.T_r # duration of one cycle
+S = waveform.m_w
 
-n_r = 150 # number of chirps
-T_M = T_r*n_r
+n_r = waveform.n_r # number of chirps
+T_M = waveform.T_M
 
 # sample settings
-f_s = 50e6 #50 MHz
-n_s = int(T_r*f_s)
+f_s = waveform.f_s
+n_s = waveform.n_s
 
-f_0 = 77.7*1e9
+f_0 = waveform.f_0
 
 # some helpful
 w_0 = 2*np.pi*f_0
-lambda_0 = c/f_0
+lambda_0 = waveform.wavelength
 
 def f_transmitted(t):
     return f_0 + S*(t%T_r)
@@ -45,7 +51,7 @@ def itr(t):
 
 
 
-t_sample = np.linspace(0, T_M, n_r*n_s)
+t_sample = waveform.t_sample
 
 v_sample = itr(t_sample)
 
@@ -57,57 +63,31 @@ plt.title("Визуализация семплов на временном от
 plt.show()
 
 
-table = np.zeros((n_r, n_s))
-
-for chirp_nr in range(n_r):
-    table[chirp_nr, :] = v_sample[(chirp_nr*n_s):(n_s*(chirp_nr+1))]
-
-table_df = pd.DataFrame(data=table, 
-                        columns=["sample_%03d"%i for i in range(n_s)], 
-                        index=["chirp_%03d"%i for i in range(n_r)])
-
+table = v_sample.reshape(n_r, n_s)
 
-chirp0_samples = table_df.iloc[0].values
-chirp0_magnitude = fft(chirp0_samples)
+range_table = dsp.range_fft(table)
+chirp0_magnitude = range_table[0]
 
 # frequencies found by FFT, will be used later
-frequencies = np.arange(0, n_s//2)*f_s/n_s
+frequencies = dsp.range_bins(n_s, f_s)
 
-def freq_to_range(f):
-    return f*c/(2*S)
+freq_to_range = waveform.freq_to_range
 
-ranges = np.around(freq_to_range(frequencies), decimals = 1)
+ranges = waveform.range_axis()
 
 
 plt.figure(figsize=(10,5))
-plt.plot(ranges, 2.0/n_s*np.abs(chirp0_magnitude[0:n_s//2]))
-plt.plot(ranges, 2.0/n_s*np.abs(chirp0_magnitude[0:n_s//2]), "k+")
+plt.plot(ranges, np.abs(chirp0_magnitude))
+plt.plot(ranges, np.abs(chirp0_magnitude), "k+")
 plt.xlabel("Расстояние $r$ [m]")
 plt.title("Полученное расстояние (БПФ 1 чирпа)")
 plt.show()
-print(freq_to_range(frequencies)[np.argmax(2.0/n_s*np.abs(chirp0_magnitude[0:n_s//2]))]) # out of range value in peak
-
-range_table = np.zeros((n_r, n_s//2), dtype=np.csingle)
- 
-for chirp_nr in range(n_r):
-    chirp_ad_values = table_df.iloc[chirp_nr].values
-    chirp_fft = fft(chirp_ad_values) # FFT
-    range_table[chirp_nr, :] = 2.0/n_s*chirp_fft[:n_s//2]
-
-velocity_table = np.zeros((n_r, range_table.shape[1]), dtype=np.csingle)
-
-for r in range(range_table.shape[1]):
-    range_bin_magn = range_table[:, r]
-    range_bin_fft = fft(range_bin_magn)
-    velocity_table[:, r]= 2.0/n_r*range_bin_fft
-
+print(freq_to_range(frequencies)[np.argmax(np.abs(chirp0_magnitude))]) # out of range value in peak
 
-def angle_freq_to_velocity(w):
-    return w*c/(4*np.pi*f_0)
+velocity_table = dsp.doppler_fft(range_table)
 
-omega_second = 2*np.pi*np.concatenate((np.arange(0, n_r//2), np.arange(-n_r//2, 0)[::1]))*f_chirp/n_r
 
-velocities = np.around(angle_freq_to_velocity(omega_second), decimals = 1)
+velocities = waveform.velocity_axis()
 plt.figure(figsize=(15,10))
 plt.imshow(np.abs(velocity_table))
 plt.xticks(range(ranges.size)[::20], ranges[::20]);
@@ -0,0 +1,203 @@
+import time as timer
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+import profiling
+
+
+def _stop_on_escape(event):
+    # for stopping simulation with the esc key.
+    if event.key == 'escape':
+        exit(0)
+
+
+def contour_lines(vehs):
+    # contours of all objects as one polyline, separated by NaN
+    if hasattr(vehs, 'start'):
+        gx, gy = vehs.gx, vehs.gy
+        starts = vehs.start[1:-1]
+    else:
+        contours = [veh.calc_global_contour() for veh in vehs]
+        if not contours:
+            return np.empty(0), np.empty(0)
+        gx = np.concatenate([np.ravel(x) for x, _ in contours])
+        gy = np.concatenate([np.ravel(y) for _, y in contours])
+        starts = np.cumsum([np.size(x) for x, _ in contours])[:-1]
+    return np.insert(gx, starts, np.nan), np.insert(gy, starts, np.nan)
+
+
+def object_points(vehs):
+    # centers and visible contour points of all objects
+    if hasattr(vehs, 'visible_coords'):
+        return np.stack([vehs.x, vehs.y], -1), vehs.visible_coords
+    centers = np.array([[veh.x, veh.y] for veh in vehs]).reshape(-1, 2)
+    dots = [np.asarray(veh.visible_coords).reshape(-1, 2) for veh in vehs]
+    return centers, np.concatenate(dots) if dots else np.empty((0, 2))
+
+
+class _BlitFigure:
+    # figure whose animated artists are redrawn over a saved background, the
+    # background is captured again after every full draw (resize, new limits)
+    def __init__(self, fig, artists):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.artists = artists
+        for artist in artists:
+            artist.set_animated(True)
+        self.blit = getattr(self.canvas, 'supports_blit', hasattr(self.canvas, 'copy_from_bbox'))
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('key_release_event', _stop_on_escape)
+
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def full_draw(self):
+        self.canvas.draw()
+
+    def draw(self):
+        if not self.blit:
+            self.canvas.draw_idle()
+            return
+        if self.background is None:
+            self.full_draw()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.fig.bbox)
+
+
+class LiveView:
+    # incremental animation of the simulation: the artists are created once and
+    # only their data is changed every tick. Drawing takes at most about half
+    # of the wall time, when the display falls behind the simulation up to
+    # max_skip frames in a row are not drawn. With realtime the simulation is
+    # not shown faster than its own time
+    def __init__(self, radar, vehs, max_skip=10, realtime=True, margin=10.0):
+        self.max_skip = max_skip
+        self.realtime = realtime
+        self.margin = margin
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        self._skipped = 0
+        self._last_draw = None # end and duration of the last drawn frame
+        self._start = None
+        self._t0 = None
+        self._fitted = False
+        self._scene(radar, vehs)
+        self._maps(radar)
+        plt.show(block=False)
+
+    def _scene(self, radar, vehs):
+        fig = plt.figure(1)
+        fig.clf()
+        ax = fig.add_subplot()
+        ax.set_aspect('equal', adjustable='box')
+        self.scene_ax = ax
+        self.radar_marker, = ax.plot([radar.x], [radar.y], "*r")
+        self.heading = ax.quiver([radar.x], [radar.y], [np.cos(radar.yaw)], [np.sin(radar.yaw)],
+                                 color='r', width=0.002)
+        self.contours, = ax.plot(*contour_lines(vehs), color="k")
+        centers, dots = object_points(vehs)
+        self.centers, = ax.plot(centers[:, 0], centers[:, 1], ".b")
+        self.dots = ax.scatter(dots[:, 0], dots[:, 1], color='b')
+        self.scene = _BlitFigure(fig, [self.contours, self.centers, self.dots, self.radar_marker, self.heading])
+        self._fit_scene()
+
+    def _map(self, num, rows, ranges, **kwargs):
+        fig = plt.figure(num)
+        fig.clf()
+        ax = fig.add_subplot()
+        image = ax.imshow(np.zeros((rows.size, ranges.size)), **kwargs)
+        ax.set_xticks(range(ranges.size)[::20])
+        ax.set_xticklabels(ranges[::20], rotation=90)
+        ax.set_yticks(range(rows.size)[::10])
+        ax.set_yticklabels(rows[::10])
+        ax.set_xlim([0, 200])
+        ax.set_xlabel("расстояние $r$ [m]")
+        return fig, ax, image
+
+    def _maps(self, radar):
+        ranges = radar.range_axis()
+        fig, ax, self.velocity_image = self._map(2, radar.velocity_axis(), ranges,
+                                                 cmap=plt.get_cmap('RdYlBu'))
+        ax.set_ylabel("скорость $v$ [m/s]")
+        ax.set_title("Карта скорости-расстояния объектов")
+        self.velocity_figure = _BlitFigure(fig, [self.velocity_image])
+        fig, ax, self.angle_image = self._map(3, radar.angles, ranges)
+        ax.set_ylabel("азимут $θ$ [°]")
+        ax.set_title("Карта азимута-расстояния объектов")
+        self.angle_figure = _BlitFigure(fig, [self.angle_image])
+
+    def _fit_scene(self):
+        # the limits are only changed (with a full draw) when the scene leaves them
+        xs = np.concatenate([self.contours.get_xdata(), self.radar_marker.get_xdata()])
+        ys = np.concatenate([self.contours.get_ydata(), self.radar_marker.get_ydata()])
+        offsets = self.dots.get_offsets()
+        if len(offsets):
+            xs = np.concatenate([xs, offsets[:, 0]])
+            ys = np.concatenate([ys, offsets[:, 1]])
+        x0, x1, y0, y1 = np.nanmin(xs), np.nanmax(xs), np.nanmin(ys), np.nanmax(ys)
+        (lx0, lx1), (ly0, ly1) = self.scene_ax.get_xlim(), self.scene_ax.get_ylim()
+        if self._fitted and lx0 <= x0 and x1 <= lx1 and ly0 <= y0 and y1 <= ly1:
+            return False
+        self.scene_ax.set_xlim(x0 - self.margin, x1 + self.margin)
+        self.scene_ax.set_ylim(y0 - self.margin, y1 + self.margin)
+        self._fitted = True
+        self.scene.full_draw()
+        return True
+
+    def _behind(self):
+        # the display is behind while less time has passed since the last
+        # drawn frame than it took to draw it
+        if self._last_draw is None:
+            return False
+        end, duration = self._last_draw
+        return timer.perf_counter() - end < duration
+
+    def update(self, radar, vehs, time, velocity_table, angle_table):
+        # draws the tick unless the display is behind, returns whether it was drawn
+        if self._start is None:
+            self._start, self._t0 = timer.perf_counter(), time
+        if self._behind() and self._skipped < self.max_skip:
+            self._skipped += 1
+            self.frames_skipped += 1
+            profiling.count('frames_skipped')
+            self.scene.canvas.flush_events()
+            return False
+        self._skipped = 0
+
+        start = timer.perf_counter()
+        with profiling.stage('render'):
+            self.radar_marker.set_data([radar.x], [radar.y])
+            self.heading.set_offsets([[radar.x, radar.y]])
+            self.heading.set_UVC([np.cos(radar.yaw)], [np.sin(radar.yaw)])
+            self.contours.set_data(*contour_lines(vehs))
+            centers, dots = object_points(vehs)
+            self.centers.set_data(centers[:, 0], centers[:, 1])
+            self.dots.set_offsets(dots)
+            if not self._fit_scene():
+                self.scene.draw()
+
+            for figure, image, table in ((self.velocity_figure, self.velocity_image, velocity_table),
+                                         (self.angle_figure, self.angle_image, angle_table)):
+                table = np.abs(table)
+                image.set_data(table)
+                image.set_clim(table.min(), table.max())
+                figure.draw()
+            self.scene.canvas.flush_events()
+        self.frames_drawn += 1
+        end = timer.perf_counter()
+        self._last_draw = (end, end - start)
+
+        ahead = (time - self._t0) - (end - self._start)
+        if self.realtime and ahead > 0:
+            self.scene.canvas.start_event_loop(ahead)
+        return True
@@ -0,0 +1,145 @@
+import copy
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import profiling
+from simulation import Simulation
+from writers import NullFrameWriter
+
+# state of a frame worker process: radar configuration and shared points
+_frame_worker = {}
+
+
+class Snapshots:
+    # per-tick state recorded by the kinematic pass. The points of all ticks
+    # are stored in one (3, n_points) array of azimuth, range and radial
+    # velocity, the points of the tick i are offsets[i]:offsets[i + 1]
+    def __init__(self, times, poses, points, offsets):
+        self.times = times
+        self.poses = poses # x, y, yaw, v of the radar
+        self.points = points
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.times)
+
+
+def record_snapshots(radar, vehs, sim_time=40.0, dt=0.1):
+    # sequential pass over the ticks without any signal processing
+    times, poses, points, offsets = [], [], [], [0]
+    for frame in Simulation(radar, vehs, sim_time, dt):
+        times.append(frame.time)
+        poses.append(frame.pose)
+        points.append(np.stack([frame.angle_dots, frame.dist_dots, frame.rad_v_dots]))
+        offsets.append(offsets[-1] + frame.dist_dots.size)
+
+    points = np.concatenate(points, axis=1) if points else np.empty((3, 0))
+    return Snapshots(np.array(times), np.array(poses).reshape(-1, 4), points,
+                     np.array(offsets, dtype=np.int64))
+
+
+def _init_frame_worker(radar, shm_name, shape, profile=False):
+    # with profile every frame is timed by a profiler of its own and its
+    # stages are sent back with the maps
+    shm = SharedMemory(name=shm_name)
+    _frame_worker['shm'] = shm
+    _frame_worker['points'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _frame_worker['radar'] = radar
+    _frame_worker['profile'] = profile
+
+
+def _init_frame_process(*args):
+    # the profiler of the parent process is not used by the forked workers
+    profiling.forget()
+    _init_frame_worker(*args)
+
+
+def _process_frame(task):
+    i, start, stop = task
+    radar = _frame_worker['radar']
+    points = _frame_worker['points']
+    angle_dots, dist_dots, rad_v_dots = points[:, start:stop]
+    if not _frame_worker['profile']:
+        return _compute_frame(i, angle_dots, dist_dots, rad_v_dots, radar) + (None,)
+    with profiling.capture() as profiler:
+        result = _compute_frame(i, angle_dots, dist_dots, rad_v_dots, radar)
+    return result + ((profiler.timers, profiler.counters),)
+
+
+def _compute_frame(i, angle_dots, dist_dots, rad_v_dots, radar):
+    cache = radar.cache
+    if cache is not None:
+        hits, misses = cache.hits, cache.misses
+    velocity_table = radar.cached_velocity_range_map(dist_dots, rad_v_dots)
+    angle_table = radar.cached_angle_range_map(angle_dots, dist_dots, rad_v_dots)
+    detections = None
+    if radar.detector is not None:
+        detections = radar.detect(velocity_table, angle_table)
+    # cache hits and misses of the frame, counted in the main process
+    lookups = (cache.hits - hits, cache.misses - misses) if cache is not None else (0, 0)
+    return i, np.abs(velocity_table), angle_table, detections, lookups
+
+
+def _frame_config(radar):
+    # copy of the radar that can be sent to the worker processes
+    config = copy.copy(radar)
+    config.writer = NullFrameWriter()
+    config.show_animation = False
+    return config
+
+
+def process_snapshots(radar, snapshots, workers=None, chunksize=1):
+    # computes the maps of all recorded ticks in a pool of worker processes
+    # and writes them in the order of the ticks to radar.writer
+    ranges, velocities, angles = radar.range_axis(), radar.velocity_axis(), radar.angles
+    tasks = [(i, snapshots.offsets[i], snapshots.offsets[i + 1]) for i in range(len(snapshots))]
+    shape = snapshots.points.shape
+
+    shm = SharedMemory(create=True, size=max(snapshots.points.nbytes, 1))
+    pool = None
+    try:
+        shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        shared[:] = snapshots.points
+        del shared
+
+        initargs = (_frame_config(radar), shm.name, shape)
+        # the frames of this process are timed by the profiler of the run,
+        # the workers send the stages of every frame back to be merged into it
+        profiler = profiling.active()
+        if workers == 1:
+            _init_frame_worker(*initargs)
+            results = map(_process_frame, tasks)
+        else:
+            pool = multiprocessing.Pool(workers, initializer=_init_frame_process,
+                                        initargs=initargs + (profiler is not None,))
+            results = pool.imap(_process_frame, tasks, chunksize)
+
+        for i, velocity_table, angle_table, detections, (hits, misses), stages in results:
+            time = snapshots.times[i]
+            if profiler is not None:
+                profiler.end_frame(i + 1, time, *(stages or ()))
+            if radar.cache is not None and workers != 1:
+                radar.cache.hits += hits
+                radar.cache.misses += misses
+            if radar.store_maps:
+                radar.writer.write('vel-rad', time, velocity_table, velocities, ranges)
+                radar.writer.write('azim-rad', time, angle_table, angles, ranges)
+            if detections is not None:
+                radar.writer.write_detections(time, detections)
+    finally:
+        if pool is not None:
+            # all tasks are done unless the loop was interrupted
+            pool.terminate()
+            pool.join()
+        _frame_worker.clear()
+        shm.close()
+        shm.unlink()
+    return len(snapshots)
+
+
+def run_pipeline(radar, vehs, sim_time=40.0, dt=0.1, workers=None):
+    # same output as simulation.run_simulation, the frames are processed in parallel
+    snapshots = record_snapshots(radar, vehs, sim_time, dt)
+    return process_snapshots(radar, snapshots, workers)
@@ -0,0 +1,180 @@
+import contextlib
+import json
+import threading
+import time as timer
+
+# profiler of the current run, None when profiling is switched off
+_active = None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = timer.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_time(self.name, timer.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    # named stage timers and counters of a run, optionally with a trace
+    # file that gets one JSON line with the stage times and counters per tick.
+    # The hooks can be called from other threads (AsyncFrameWriter)
+    def __init__(self, trace_path=None):
+        self.start = timer.perf_counter()
+        self.timers = {} # name -> [calls, total time, max time]
+        self.counters = {}
+        self.ticks = 0
+        self._tick_timers = {}
+        self._tick_counters = {}
+        self.trace = open(trace_path, 'w') if trace_path else None
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def _add_time(self, name, calls, elapsed, longest):
+        t = self.timers.get(name)
+        if t is None:
+            self.timers[name] = [calls, elapsed, longest]
+        else:
+            t[0] += calls
+            t[1] += elapsed
+            if longest > t[2]:
+                t[2] = longest
+
+    def add_time(self, name, elapsed):
+        with self._lock:
+            self._add_time(name, 1, elapsed, elapsed)
+            if self.trace is not None:
+                self._tick_timers[name] = self._tick_timers.get(name, 0.0) + elapsed
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self.trace is not None:
+                self._tick_counters[name] = self._tick_counters.get(name, 0) + n
+
+    def end_tick(self, time):
+        with self._lock:
+            self.ticks += 1
+            if self.trace is not None:
+                self.trace.write(json.dumps({'tick': self.ticks, 'time': time, 'stages': self._tick_timers,
+                                             'counters': self._tick_counters}) + '\n')
+                self._tick_timers = {}
+                self._tick_counters = {}
+
+    def end_frame(self, tick, time, timers=None, counters=None):
+        # ends a frame of the parallel pipeline. The timers and counters of a
+        # frame timed by another profiler (a worker process) are added, without
+        # them the stages timed since the last trace line belong to the frame.
+        # The trace gets a line of its own for every frame
+        with self._lock:
+            if timers is not None:
+                for name, (calls, elapsed, longest) in timers.items():
+                    self._add_time(name, calls, elapsed, longest)
+                for name, n in counters.items():
+                    self.counters[name] = self.counters.get(name, 0) + n
+                timers = {name: t[1] for name, t in timers.items()}
+            else:
+                timers, counters = self._tick_timers, self._tick_counters
+                self._tick_timers = {}
+                self._tick_counters = {}
+            if self.trace is not None:
+                self.trace.write(json.dumps({'tick': tick, 'time': time, 'frame': True,
+                                             'stages': timers, 'counters': counters}) + '\n')
+
+    def report(self):
+        with self._lock:
+            return self._report()
+
+    def _report(self):
+        return {
+            'wall_time': timer.perf_counter() - self.start,
+            'ticks': self.ticks,
+            'stages': {name: {'calls': calls, 'total': total, 'mean': total / calls, 'max': longest}
+                       for name, (calls, total, longest) in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+
+def enable(trace_path=None):
+    # switches profiling on for the hooks of this process and returns the profiler
+    global _active
+    disable()
+    _active = Profiler(trace_path)
+    return _active
+
+
+def disable():
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = None
+
+
+def stage(name):
+    # with profiling.stage('fft'): ... adds the time of the block to the stage
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+def active():
+    return _active
+
+
+def forget():
+    # drops the profiler inherited by a forked process without closing it,
+    # its trace file belongs to the parent process
+    global _active
+    _active = None
+
+
+@contextlib.contextmanager
+def capture():
+    # times the block with a profiler of its own, which it yields; the
+    # profiler of the run is switched back on afterwards
+    global _active
+    previous, _active = _active, Profiler()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+def end_tick(time):
+    if _active is not None:
+        _active.end_tick(time)
@@ -0,0 +1,205 @@
+import argparse
+import itertools
+import json
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import FrameCache
+from detection import CfarDetector
+from fmcwradar import Fmcw
+from pipeline import run_pipeline
+import profiling
+from scenario import load_objects, load_radar, load_waveform
+from simulation import run_simulation
+from vehicle import VehicleFleet
+from writers import AsyncFrameWriter, BinaryFrameWriter, CsvFrameWriter
+
+# scenario parameters of the simulation loop, the others are Fmcw attributes
+RUN_PARAMS = {'sim_time': 40.0, 'dt': 0.1, 'cfar': None}
+
+
+def parse_value(s):
+    if s == 'None':
+        return None
+    if s in ('True', 'False'):
+        return s == 'True'
+    for t in (int, float):
+        try:
+            return t(s)
+        except ValueError:
+            pass
+    return s
+
+
+def parse_grid(items):
+    # ["n_rx=8,16", "dt=0.1"] -> {'n_rx': [8, 16], 'dt': [0.1]}
+    grid = {}
+    for item in items or []:
+        key, sep, values = item.partition('=')
+        if not sep or not key:
+            raise ValueError("Параметр должен быть задан в виде имя=значение1,значение2: %s" % item)
+        grid[key] = [parse_value(v) for v in values.split(',')]
+    return grid
+
+
+def make_scenarios(object_files, radar_file="radar_input.txt", grid=None, waveform_file=None):
+    # one scenario per object file and combination of the grid values, the
+    # chirp parameters of waveform_file can be changed by the grid as well
+    grid = grid or {}
+    keys = sorted(grid)
+    scenarios, names = [], set()
+    for objects in object_files:
+        stem = os.path.splitext(os.path.basename(objects))[0]
+        for values in itertools.product(*(grid[k] for k in keys)):
+            name = '_'.join([stem] + ['%s=%s' % kv for kv in zip(keys, values)])
+            unique, i = name, 1
+            while unique in names:
+                i += 1
+                unique = '%s_%d' % (name, i)
+            names.add(unique)
+            scenarios.append({'name': unique, 'radar': radar_file, 'objects': objects,
+                              'waveform': waveform_file, 'params': dict(zip(keys, values))})
+    return scenarios
+
+
+def apply_params(radar, params):
+    for key, value in params.items():
+        if not hasattr(radar, key):
+            raise ValueError("Неизвестный параметр радара: %s" % key)
+        setattr(radar, key, value)
+
+
+def run_scenario(scenario, output_root, csv=False, frame_workers=None, profile=False, trace=False,
+                 cache_dir=None, cache_bytes=2**30):
+    # runs one scenario without any interaction and stores its maps in
+    # output_root/<name>, returns the timing of the run. With frame_workers
+    # the frames of the scenario are processed by a pool of processes.
+    # profile and trace store the stage timings in profile.json and trace.jsonl,
+    # with cache_dir the maps of ticks computed before are read from a FrameCache
+    start = timer.perf_counter()
+    params = dict(scenario.get('params', {}))
+    run_params = {k: params.pop(k, v) for k, v in RUN_PARAMS.items()}
+
+    radar_data = load_radar(scenario['radar'])
+    objects_data = load_objects(scenario['objects'])
+    waveform = load_waveform(scenario['waveform']) if scenario.get('waveform') else None
+
+    path = os.path.join(output_root, scenario['name'])
+    writer = AsyncFrameWriter(CsvFrameWriter(path) if csv else BinaryFrameWriter(path))
+    profiler = None
+    if profile or trace:
+        profiler = profiling.enable(os.path.join(path, 'trace.jsonl') if trace else None)
+    try:
+        radar = Fmcw(*radar_data, False, writer, waveform)
+        apply_params(radar, params)
+        if cache_dir:
+            radar.cache = FrameCache(cache_dir, cache_bytes)
+        if run_params['cfar']:
+            radar.detector = CfarDetector(run_params['cfar'])
+        vehs = VehicleFleet(*objects_data.T, radar.d)
+        if frame_workers:
+            n_ticks = run_pipeline(radar, vehs, run_params['sim_time'], run_params['dt'], frame_workers)
+        else:
+            n_ticks = run_simulation(radar, vehs, run_params['sim_time'], run_params['dt'])
+    finally:
+        writer.close()
+        if profiler is not None:
+            profiler.save(os.path.join(path, 'profile.json'))
+            profiling.disable()
+
+    elapsed = timer.perf_counter() - start
+    result = {
+        'name': scenario['name'],
+        'path': path,
+        'objects': len(vehs),
+        'ticks': n_ticks,
+        'time': elapsed,
+        'ticks_per_second': n_ticks / elapsed if elapsed > 0 else 0.0,
+    }
+    if radar.cache is not None:
+        result['cache'] = radar.cache.stats()
+    return result
+
+
+def _run_scenario_safe(scenario, output_root, csv, frame_workers=None, profile=False, trace=False,
+                       cache_dir=None, cache_bytes=2**30):
+    try:
+        return run_scenario(scenario, output_root, csv, frame_workers, profile, trace, cache_dir, cache_bytes)
+    except Exception as e:
+        return {'name': scenario['name'], 'error': '%s: %s' % (type(e).__name__, e)}
+
+
+def run_batch(scenarios, output_root, workers=None, csv=False, progress=True, frame_workers=None,
+              profile=False, trace=False, cache_dir=None, cache_bytes=2**30):
+    # runs the scenarios in a pool of worker processes, the results are
+    # also stored in output_root/results.json. frame_workers parallelizes
+    # the frames of every scenario instead and needs workers=1. All scenarios
+    # share the frame cache in cache_dir
+    os.makedirs(output_root, exist_ok=True)
+    start = timer.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        if not progress:
+            return
+        if 'error' in result:
+            status = 'ошибка: ' + result['error']
+        else:
+            status = '%d тактов за %.1f с (%.2f тактов/с)' % (result['ticks'], result['time'],
+                                                             result['ticks_per_second'])
+            if 'cache' in result:
+                status += ', попаданий в кэш %.0f%%' % (100 * result['cache']['hit_rate'])
+        print('[%d/%d] %s: %s' % (len(results), len(scenarios), result['name'], status), flush=True)
+
+    if frame_workers and workers != 1:
+        raise ValueError("Параллельная обработка тактов сценария возможна только при workers=1")
+
+    if workers == 1:
+        for scenario in scenarios:
+            report(_run_scenario_safe(scenario, output_root, csv, frame_workers, profile, trace,
+                                      cache_dir, cache_bytes))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_scenario_safe, s, output_root, csv, None, profile, trace,
+                                   cache_dir, cache_bytes) for s in scenarios]
+            for future in as_completed(futures):
+                report(future.result())
+
+    with open(os.path.join(output_root, 'results.json'), 'w', encoding='utf-8') as f:
+        json.dump({'time': timer.perf_counter() - start, 'scenarios': results}, f,
+                  indent=1, ensure_ascii=False)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетное моделирование работы FMCW радара без взаимодействия с пользователем")
+    parser.add_argument('objects', nargs='+', help="файлы с описанием объектов, по одному сценарию на файл")
+    parser.add_argument('--radar', default="radar_input.txt", help="файл с описанием радара")
+    parser.add_argument('--waveform', default=None, help="файл с параметрами сигнала радара")
+    parser.add_argument('--output-root', required=True, help="папка для результатов всех сценариев")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию число ядер)")
+    parser.add_argument('--param', action='append', metavar='ИМЯ=ЗНАЧ1,ЗНАЧ2',
+                        help="параметр сценария (sim_time, dt, cfar или атрибут Fmcw), несколько значений образуют сетку")
+    parser.add_argument('--frame-workers', type=int, default=None,
+                        help="число процессов для параллельной обработки тактов одного сценария (вместе с --workers 1)")
+    parser.add_argument('--csv', action='store_true', help="записывать карты в CSV файлы")
+    parser.add_argument('--profile', action='store_true', help="сохранять время этапов в profile.json")
+    parser.add_argument('--trace', action='store_true', help="сохранять время этапов каждого такта в trace.jsonl")
+    parser.add_argument('--cache', default=None, metavar='ПАПКА',
+                        help="кэш карт на диске, повторяющиеся такты не пересчитываются")
+    parser.add_argument('--cache-size', type=float, default=1024, help="размер кэша карт (МБ)")
+    args = parser.parse_args(argv)
+    if args.frame_workers and args.workers != 1:
+        parser.error("--frame-workers используется вместе с --workers 1")
+
+    scenarios = make_scenarios(args.objects, args.radar, parse_grid(args.param), args.waveform)
+    results = run_batch(scenarios, args.output_root, args.workers, args.csv,
+                        frame_workers=args.frame_workers, profile=args.profile, trace=args.trace,
+                        cache_dir=args.cache, cache_bytes=int(args.cache_size * 2**20))
+    return 1 if any('error' in r for r in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
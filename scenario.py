@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from waveform import WAVEFORM_PARAMS, Waveform
+
+RADAR_FIELDS = ('x', 'y', 'v', 'max_v', 'yaw', 'a', 'omega')
+OBJECT_FIELDS = ('x', 'y', 'v', 'max_v', 'yaw', 'a', 'omega', 'w', 'L')
+
+RADAR_HELP = ("В файле {name} должно содержаться через пробел свойства радара x, y, v, max_v, yaw, a, omega - его координаты, начальная и максимальная скорость (м/с), его угол направления (в градусах), ускорение скорости и угла\n"
+              "Пример содержания входного файла для радара:\n0 0 3 5 90 1 0")
+OBJECT_HELP = ("В файле {name} должно содержаться в каждой строке через пробел свойства соответсвующих обьектов x, y, v, max_v, yaw, a, omega, w, L, - координаты, начальная и максимальная скорость (м/с), угол направления (в градусах), ускорение скорости и угла, ширину и длину объекта\n"
+               "Пример содержания входного файла для двух объектов:\n5 5 3 5 45 1 0 2 1\n-10 25 10 12 -45 2 0 3 1\n"
+               "Объекты также можно задать файлом .csv (через запятую, первой строкой может идти заголовок с именами полей) "
+               "или файлом NumPy .npy/.npz (массив (n, 9), массив с именованными полями или по массиву на каждое поле)")
+
+WAVEFORM_HELP = ("В файле {name} в каждой строке через пробел задается имя и значение параметра сигнала радара: f_0 - несущая частота, f_r - девиация частоты, f_chirp - частота повторения чирпов (Гц), n_r - число чирпов, f_s - частота дискретизации (Гц), n_s - число отсчетов в чирпе. Незаданные параметры принимают значения по умолчанию\n"
+                 "Пример содержания входного файла для сигнала:\nn_r 64\nf_s 25e6")
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+# text files of this extension are comma separated, the others whitespace separated
+CSV_EXTENSIONS = ('.csv',)
+NUMPY_EXTENSIONS = ('.npy', '.npz')
+# at most this many errors of a file are listed
+MAX_REPORTED_ERRORS = 20
+
+
+def _error(name, errors, help):
+    lines = errors[:MAX_REPORTED_ERRORS]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        lines.append("... и еще %d ошибок" % (len(errors) - MAX_REPORTED_ERRORS))
+    return ScenarioError("Входной файл %s содержит ошибки:\n" % name + "\n".join(lines) + "\n"
+                         + help.format(name=name))
+
+
+def _split(line, sep):
+    line = line.split('#')[0]
+    return [f.strip() for f in line.split(sep)] if sep == ',' else line.split()
+
+
+def _is_number(s):
+    try:
+        float(s)
+    except ValueError:
+        return False
+    return True
+
+
+def _header(path, sep, fields):
+    # column order of a file whose first line names the fields, None without
+    # a header and [] for a line of names that are not the fields
+    with open(path, "r") as f:
+        for line in f:
+            names = _split(line, sep)
+            if not names:
+                continue
+            if any(_is_number(n) for n in names):
+                return None
+            return names if sorted(names) == sorted(fields) else []
+    return None
+
+
+def _value_errors(table, checks):
+    # (row, message) of the value errors of all rows in one pass,
+    # checks(table) gives (mask, message) pairs
+    checks = [(~np.isfinite(table).all(axis=1), "значения должны быть конечными числами")] + \
+        (checks(table) if checks and table.shape[0] else [])
+    return sorted(((i, message) for mask, message in checks for i in np.flatnonzero(mask)), key=lambda e: e[0])
+
+
+def _diagnose(path, sep, fields, checks):
+    # all malformed lines of a text file and the value errors of the other
+    # lines in one pass
+    errors, rows, numbers = [], [], []
+    order = None
+    with open(path, "r") as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        values = _split(line, sep)
+        if not values:
+            continue
+        if sorted(values) == sorted(fields):
+            order = [values.index(field) for field in fields]
+            continue
+        if len(values) != len(fields):
+            errors.append((i, "ожидается %d значений, найдено %d" % (len(fields), len(values))))
+            continue
+        bad = [value for value in values if not _is_number(value)]
+        for value in bad:
+            errors.append((i, "значение '%s' не является числом" % value))
+        if not bad:
+            row = [float(value) for value in values]
+            rows.append([row[j] for j in order] if order else row)
+            numbers.append(i)
+    table = np.array(rows, dtype=np.float64).reshape(-1, len(fields))
+    errors += [(numbers[row], message) for row, message in _value_errors(table, checks)]
+    return ["строка %d: %s" % (i + 1, message) for i, message in sorted(errors, key=lambda e: e[0])]
+
+
+def _read_text(path, fields, name, help, checks):
+    sep = ',' if os.path.splitext(path)[1].lower() in CSV_EXTENSIONS else r'\s+'
+    header = _header(path, sep, fields)
+    if header == []:
+        raise _error(name, ["заголовок должен содержать поля " + ", ".join(fields)], help)
+    try:
+        table = pd.read_csv(path, sep=sep, header=0 if header else None, comment='#',
+                            skip_blank_lines=True, dtype=np.float64, engine='c')
+    except pd.errors.EmptyDataError:
+        return np.empty((0, len(fields)))
+    except (ValueError, pd.errors.ParserError):
+        table = None
+    if table is not None and table.shape[1] == len(fields):
+        table = table[list(fields)].to_numpy(dtype=np.float64) if header else table.to_numpy(dtype=np.float64)
+        if not _value_errors(table, checks):
+            return table
+    # short lines are filled with NaN by the parser, the lines are only
+    # checked one by one when something is wrong, so the errors have the
+    # numbers of their lines
+    raise _error(name, _diagnose(path, sep, fields, checks) or ["неверное число столбцов"], help)
+
+
+def _read_numpy(path, fields, name, help):
+    # (n, n_fields) array, structured array or .npz archive with one array per field
+    data = np.load(path, allow_pickle=False)
+    if isinstance(data, np.lib.npyio.NpzFile):
+        with data:
+            missing = [f for f in fields if f not in data.files]
+            if missing and len(data.files) == 1:
+                return _read_numpy_array(data[data.files[0]], fields, name, help)
+            if missing:
+                raise _error(name, ["нет массивов " + ", ".join(missing)], help)
+            columns = [np.asarray(data[f], dtype=np.float64).ravel() for f in fields]
+        if len(set(c.size for c in columns)) > 1:
+            raise _error(name, ["массивы полей имеют разную длину"], help)
+        return np.stack(columns, -1)
+    return _read_numpy_array(data, fields, name, help)
+
+
+def _read_numpy_array(data, fields, name, help):
+    if data.dtype.names:
+        missing = [f for f in fields if f not in data.dtype.names]
+        if missing:
+            raise _error(name, ["нет полей " + ", ".join(missing)], help)
+        return np.stack([data[f].astype(np.float64).ravel() for f in fields], -1)
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1 and data.size == len(fields):
+        data = data.reshape(1, -1)
+    if data.ndim != 2 or data.shape[1] != len(fields):
+        raise _error(name, ["массив формы %s, ожидается (n, %d)" % (data.shape, len(fields))], help)
+    return data
+
+
+def load_table(path, fields, help=OBJECT_HELP, checks=None):
+    # (n, len(fields)) float64 array of a whitespace separated text file, a
+    # CSV file (both optionally with a header naming the fields) or a NumPy
+    # .npy/.npz file. Malformed lines and the values rejected by checks are
+    # reported together in one ScenarioError
+    name = os.path.basename(path)
+    if not os.path.isfile(path):
+        raise ScenarioError("Входного файла %s нет.\n" % name + help.format(name=name))
+    try:
+        if os.path.splitext(path)[1].lower() in NUMPY_EXTENSIONS:
+            table = _read_numpy(path, fields, name, help)
+            errors = _value_errors(table, checks)
+            if errors:
+                raise _error(name, ["запись %d: %s" % (i + 1, message) for i, message in errors], help)
+        else:
+            table = _read_text(path, fields, name, help, checks)
+    except ScenarioError:
+        raise
+    except (IOError, ValueError) as e:
+        raise _error(name, [str(e)], help)
+    return table
+
+
+def _object_checks(objects):
+    columns = dict(zip(OBJECT_FIELDS, objects.T))
+    return [
+        (~(columns['w'] > 0), "ширина w должна быть положительной"),
+        (~(columns['L'] > 0), "длина L должна быть положительной"),
+        (columns['max_v'] < 0, "максимальная скорость max_v не может быть отрицательной"),
+    ]
+
+
+def _radar_checks(radar):
+    return [(radar[:, RADAR_FIELDS.index('max_v')] < 0, "максимальная скорость max_v не может быть отрицательной")]
+
+
+def load_radar(path="radar_input.txt"):
+    # x, y, v, max_v, yaw, a, omega of the radar
+    name = os.path.basename(path)
+    table = load_table(path, RADAR_FIELDS, RADAR_HELP, _radar_checks)
+    if table.shape[0] != 1:
+        raise _error(name, ["ожидается одна запись, найдено %d" % table.shape[0]], RADAR_HELP)
+    return table[0]
+
+
+def load_objects(path="object_input.txt"):
+    # (n_objects, 9) array of x, y, v, max_v, yaw, a, omega, w, L
+    return load_table(path, OBJECT_FIELDS, OBJECT_HELP, _object_checks)
+
+
+def load_waveform(path="waveform_input.txt"):
+    # Waveform with the parameters of the file, the others keep their defaults
+    name = os.path.basename(path)
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except IOError:
+        raise ScenarioError("Входного файла %s для сигнала радара нет.\n" % name + WAVEFORM_HELP.format(name=name))
+
+    params = {}
+    for i, line in enumerate(lines):
+        fields = line.split('#')[0].split()
+        if not fields:
+            continue
+        try:
+            if len(fields) != 2 or fields[0] not in WAVEFORM_PARAMS:
+                raise ValueError
+            params[fields[0]] = float(fields[1])
+        except ValueError:
+            raise ScenarioError("Входной файл %s содержит ошибку в %d строке\n" % (name, i + 1)
+                                + WAVEFORM_HELP.format(name=name))
+    try:
+        return Waveform(**params)
+    except ValueError as e:
+        raise ScenarioError("Входной файл %s содержит ошибку: %s\n" % (name, e) + WAVEFORM_HELP.format(name=name))
@@ -0,0 +1,37 @@
+import numpy as np
+
+import profiling
+from visibility import bearing, visible_points
+
+
+def radar_points(radar, coords, v, yaw):
+    # azimuth (°) relative to the heading of the radar, range and radial
+    # velocity of the points seen by the radar, points out of its range or
+    # outside of its field of view are dropped
+    dx = coords[:, 0] - radar.x
+    dy = coords[:, 1] - radar.y
+    dist = np.hypot(dx, dy)
+    angle = bearing(radar, coords[:, 0], coords[:, 1])
+    visible = (dist > 0) & (dist <= radar.visible_range()) & (np.abs(angle) <= radar.max_angle)
+
+    dx, dy, dist, angle = dx[visible], dy[visible], dist[visible], angle[visible]
+    v, yaw = v[visible], yaw[visible]
+
+    rel_vx = v * np.cos(yaw) - radar.v * np.cos(radar.yaw)
+    rel_vy = v * np.sin(yaw) - radar.v * np.sin(radar.yaw)
+    rad_v = (dx * rel_vx + dy * rel_vy) / dist
+    return angle, dist, rad_v
+
+
+def update_radar_points(radar, vehs):
+    # vehs is a VehicleFleet or a list of VehicleSimulator objects
+    with profiling.stage('points'):
+        # visible edges are the ones facing the radar
+        if hasattr(vehs, 'set_viewpoint'):
+            vehs.set_viewpoint(radar.x, radar.y)
+        else:
+            for veh in vehs:
+                veh.set_viewpoint(radar.x, radar.y)
+        points = visible_points(radar, vehs)
+        radar.angle_dots, radar.dist_dots, radar.rad_v_dots = radar_points(radar, *points)
+    profiling.count('points', radar.dist_dots.size)
@@ -0,0 +1,101 @@
+from liveview import LiveView
+import profiling
+import scene
+
+
+class Frame:
+    # state of one tick of a Simulation. The chirp matrix, the maps and the
+    # detections are computed on first access only
+    def __init__(self, radar, time):
+        self.radar = radar
+        self.time = time
+        self.pose = (radar.x, radar.y, radar.yaw, radar.v)
+        # ground truth: azimuth (°), range (m) and radial velocity (m/s) of the visible points
+        self.angle_dots = radar.angle_dots
+        self.dist_dots = radar.dist_dots
+        self.rad_v_dots = radar.rad_v_dots
+        self._chirps = None
+        self._velocity_table = None
+        self._angle_table = None
+        self._detections = None
+
+    @property
+    def chirps(self):
+        # (n_r, n_s) raw chirp matrix, always synthesized in the time domain
+        if self._chirps is None:
+            self._chirps = self.radar.synthesize_chirps(self.dist_dots, self.rad_v_dots)
+        return self._chirps
+
+    @property
+    def velocity_range_map(self):
+        # complex range-Doppler map, the same as the one of radar.synthesis_mode
+        # whether the chirps were read before or not
+        if self._velocity_table is None:
+            self._velocity_table = self.radar.cached_velocity_range_map(self.dist_dots, self.rad_v_dots,
+                                                                        self._chirps)
+        return self._velocity_table
+
+    @property
+    def angle_range_map(self):
+        # |azimuth-range map|
+        if self._angle_table is None:
+            self._angle_table = self.radar.cached_angle_range_map(self.angle_dots, self.dist_dots,
+                                                                  self.rad_v_dots)
+        return self._angle_table
+
+    @property
+    def detections(self):
+        # detections of radar.detector in both maps
+        if self._detections is None:
+            if self.radar.detector is None:
+                raise ValueError("Для обнаружения целей радару нужно задать detector")
+            self._detections = self.radar.detect(self.velocity_range_map, self.angle_range_map)
+        return self._detections
+
+
+class Simulation:
+    # iterating a Simulation advances the radar and the objects every dt
+    # until sim_time and yields a Frame per tick, nothing is written to disk
+    def __init__(self, radar, vehs, sim_time=40.0, dt=0.1):
+        self.radar = radar
+        self.vehs = vehs
+        self.sim_time = sim_time
+        self.dt = dt
+
+    def __iter__(self):
+        time = 0.0
+        while time <= self.sim_time:
+            time += self.dt
+            self.radar.update(self.dt)
+            # vehs is a VehicleFleet or a list of VehicleSimulator objects
+            if hasattr(self.vehs, 'update'):
+                self.vehs.update(self.dt)
+            else:
+                for veh in self.vehs:
+                    veh.update(self.dt)
+            scene.update_radar_points(self.radar, self.vehs)
+            yield Frame(self.radar, time)
+            profiling.end_tick(time)
+
+
+def run_simulation(radar, vehs, sim_time=40.0, dt=0.1, show_animation=None):
+    # runs the simulation and hands the maps of every tick to radar.writer,
+    # returns the number of ticks. With show_animation (by default
+    # radar.show_animation) the scene and the maps are shown in a LiveView
+    if show_animation is None:
+        show_animation = radar.show_animation
+    view = None
+    n_ticks = 0
+    for frame in Simulation(radar, vehs, sim_time, dt):
+        radar.find_velocity_range_map(frame.time)
+        radar.find_angle_range_map(frame.time)
+        if radar.detector is not None:
+            radar.find_detections(frame.time)
+        n_ticks += 1
+
+        if show_animation:
+            if view is None:
+                view = LiveView(radar, vehs)
+            view.update(radar, vehs, frame.time, radar.velocity_table, radar.angle_table)
+
+    return n_ticks
@@ -0,0 +1,174 @@
+import numpy as np
+
+import dsp
+import profiling
+
+# upper bound for the temporary (points x samples) phase matrix of one chunk
+MAX_CHUNK_BYTES = 64 * 2**20
+
+
+def beat_phase(t, t_ramp, r0, v, f_0, m_w, c):
+    # phase of the beat signal of points with initial ranges r0 and radial
+    # velocities v at times t (t_ramp = t % T_r, the time inside the ramp)
+    r = r0[:, None] + v[:, None] * t[None, :]
+    w_itr = (2*m_w/c) * r
+    w_itr += (2*f_0/c) * v[:, None]
+    w_itr *= 2*np.pi*t_ramp[None, :]
+    r *= 4*np.pi*f_0/c
+    w_itr += r
+    return w_itr
+
+
+def synthesize(t, t_ramp, dist, rad_v, f_0, m_w, c, weights=None, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """Sum of the beat signals of all points sampled at times t.
+
+    Without weights the result has the shape of t. With a (n_groups, n_points)
+    weights matrix every output row is the weighted sum over the points,
+    complex weights shift the phase of the corresponding point signal.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    t_ramp = np.asarray(t_ramp, dtype=np.float64)
+    dist = np.asarray(dist, dtype=np.float64).ravel()
+    rad_v = np.asarray(rad_v, dtype=np.float64).ravel()
+
+    n_points = dist.size
+    if weights is None:
+        out = np.zeros(t.size)
+    else:
+        weights = np.asarray(weights)
+        out = np.zeros((weights.shape[0], t.size))
+    if n_points == 0:
+        return out
+
+    profiling.count('samples_synthesized', n_points * t.size)
+    # three float64 temporaries per (point, sample) are alive at the same time
+    chunk = max(1, int(max_chunk_bytes // (3 * 8 * t.size)))
+    with profiling.stage('synthesis'):
+        for start in range(0, n_points, chunk):
+            stop = min(start + chunk, n_points)
+            phase = beat_phase(t, t_ramp, dist[start:stop], rad_v[start:stop], f_0, m_w, c)
+            if weights is None:
+                np.cos(phase, out=phase)
+                out += phase.sum(axis=0)
+            elif np.iscomplexobj(weights):
+                w = weights[:, start:stop]
+                sin = np.sin(phase)
+                np.cos(phase, out=phase)
+                # Re(w * exp(i*phase)) = Re(w)*cos(phase) - Im(w)*sin(phase)
+                out += w.real @ phase
+                out -= w.imag @ sin
+            else:
+                np.cos(phase, out=phase)
+                out += weights[:, start:stop] @ phase
+    return out
+
+
+def beat_tones(dist, rad_v, dt, n_s, n_chirps, T_r, f_0, m_w, c):
+    # the beat signal of every point approximated by a tone: phase of the first
+    # sample, frequency in cycles per sample and phase progression in cycles
+    # per chirp. The phase of beat_phase is linearized around the middle
+    # sample of the middle chirp; dt is the sample period of the time base,
+    # whose samples drift against the ramps by n_s*dt - T_r per chirp
+    dist = np.asarray(dist, dtype=np.float64).ravel()
+    rad_v = np.asarray(rad_v, dtype=np.float64).ravel()
+    t_chirp = n_s * dt
+    drift = t_chirp - T_r
+    k_c = (n_s - 1) / 2
+    m_c = (n_chirps - 1) / 2
+    t = (m_c*n_s + k_c) * dt
+    t_ramp = k_c*dt + m_c*drift
+    r = dist + rad_v*t
+    w_itr = 2*f_0*rad_v/c + 2*m_w*r/c
+    phase = 2*np.pi*w_itr*t_ramp + 4*np.pi*f_0/c*r
+    # derivatives of the phase over the samples and over the chirps, in cycles
+    fast = 2*m_w*rad_v*dt/c*t_ramp + w_itr*dt + 2*f_0*rad_v*dt/c
+    slow = 2*m_w*rad_v*t_chirp/c*t_ramp + w_itr*drift + 2*f_0*rad_v*t_chirp/c
+    phase0 = phase - 2*np.pi*(fast*k_c + slow*m_c)
+    return phase0, fast, slow
+
+
+def _with_images(amplitude, fast, slow=None):
+    # a real tone a*exp(iθ)/2 + conj(a)*exp(-iθ)/2 as two complex tones,
+    # frequencies are folded into [-0.5, 0.5) like in the sampled signal
+    fast = fast - np.round(fast)
+    amplitude = np.concatenate([amplitude, np.conj(amplitude)])
+    fast = np.concatenate([fast, -fast])
+    if slow is not None:
+        slow = np.concatenate([slow, -slow])
+    return amplitude, fast, slow
+
+
+def _kernel_bins(freq, n_fft, kernel):
+    # kernel FFT bins around every frequency and the kernel offsets from them
+    half = kernel // 2
+    bins = np.round(freq * n_fft).astype(np.int64)[:, None] + np.arange(-half, half + 1)
+    return bins, freq[:, None] - bins / n_fft
+
+
+def analytic_range_spectrum(amplitude, fast, rows, n_rows, n_s, n_fft=None, window=None,
+                            kernel=8, dtype=np.complex64, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """Range FFT of real tones without synthesizing them.
+
+    Tone i has the complex amplitude amplitude[i] at the first sample and
+    fast[i] cycles per sample and is added to the row rows[i] of the
+    (n_rows, n_fft//2) result. Every tone only reaches kernel + 1 bins
+    around its frequency, the same normalization as dsp.range_fft is used.
+    """
+    n_fft = n_fft or n_s
+    n_bins = n_fft // 2
+    out = np.zeros(n_rows * n_bins, dtype=np.complex128)
+    rows = np.asarray(rows, dtype=np.int64).ravel()
+    amplitude, fast, _ = _with_images(np.asarray(amplitude).ravel(), np.asarray(fast).ravel())
+    rows = np.concatenate([rows, rows])
+
+    chunk = max(1, int(max_chunk_bytes // (4 * 16 * (kernel + 1))))
+    with profiling.stage('synthesis'):
+        for start in range(0, fast.size, chunk):
+            stop = min(start + chunk, fast.size)
+            bins, delta = _kernel_bins(fast[start:stop], n_fft, kernel)
+            values = amplitude[start:stop, None] * dsp.window_kernel(window, n_s, delta)
+            valid = (bins >= 0) & (bins < n_bins)
+            idx = (rows[start:stop, None] * n_bins + bins)[valid]
+            values = values[valid]
+            out.real += np.bincount(idx, weights=values.real, minlength=out.size)
+            out.imag += np.bincount(idx, weights=values.imag, minlength=out.size)
+    out *= dsp.window_scale(window, n_s) / 2
+    return out.reshape(n_rows, n_bins).astype(dtype, copy=False)
+
+
+def analytic_range_doppler(amplitude, fast, slow, n_s, n_r, n_fft=None, n_doppler_fft=None,
+                           window=None, doppler_window=None, kernel=8, dtype=np.complex64,
+                           max_chunk_bytes=MAX_CHUNK_BYTES):
+    """Range-Doppler map of real tones without synthesizing them.
+
+    Like analytic_range_spectrum, the phase of tone i advances by slow[i]
+    cycles from chirp to chirp. Every tone only reaches (kernel + 1)**2 cells
+    of the (n_doppler_fft, n_fft//2) map, the normalization is the one of
+    dsp.range_doppler_map.
+    """
+    n_fft = n_fft or n_s
+    n_doppler_fft = n_doppler_fft or n_r
+    n_bins = n_fft // 2
+    # the Doppler axis wraps, a wider kernel would add bins twice
+    kernel = min(kernel, n_doppler_fft - 1)
+    out = np.zeros(n_doppler_fft * n_bins, dtype=np.complex128)
+    amplitude, fast, slow = _with_images(np.asarray(amplitude).ravel(), np.asarray(fast).ravel(),
+                                         np.asarray(slow, dtype=np.float64).ravel())
+
+    chunk = max(1, int(max_chunk_bytes // (4 * 16 * (kernel + 1)**2)))
+    with profiling.stage('synthesis'):
+        for start in range(0, fast.size, chunk):
+            stop = min(start + chunk, fast.size)
+            bins, delta = _kernel_bins(fast[start:stop], n_fft, kernel)
+            k_range = dsp.window_kernel(window, n_s, delta)
+            doppler, delta = _kernel_bins(slow[start:stop], n_doppler_fft, kernel)
+            k_doppler = dsp.window_kernel(doppler_window, n_r, delta)
+            values = (amplitude[start:stop, None] * k_doppler)[:, :, None] * k_range[:, None, :]
+            valid = np.broadcast_to(((bins >= 0) & (bins < n_bins))[:, None, :], values.shape)
+            idx = (doppler % n_doppler_fft)[:, :, None] * n_bins + bins[:, None, :]
+            idx = idx[valid]
+            values = values[valid]
+            out.real += np.bincount(idx, weights=values.real, minlength=out.size)
+            out.imag += np.bincount(idx, weights=values.imag, minlength=out.size)
+    out *= dsp.window_scale(window, n_s) * dsp.window_scale(doppler_window, n_r) / 2
+    return out.reshape(n_doppler_fft, n_bins).astype(dtype, copy=False)
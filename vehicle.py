@@ -1,7 +1,45 @@
+from functools import lru_cache
+
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.spatial.transform import Rotation as Rot
 
+import profiling
+
+
+def advance(x, y, yaw, v, a, omega, max_v, dt):
+    # one kinematic step, works on scalars and on arrays of objects
+    x = x + v * np.cos(yaw) * dt
+    y = y + v * np.sin(yaw) * dt
+    yaw = yaw + omega * dt
+    v = np.minimum(v + a * dt, max_v)
+    return x, y, yaw, v
+
+
+@lru_cache(maxsize=1024)
+def contour_template(w, L, d):
+    # contour of a w x L rectangle in the body frame interpolated with
+    # the point spacing d, n_edges are the end offsets of its 4 edges.
+    # Templates are shared between objects of the same size, so the
+    # returned arrays are read-only
+    w, L, d = float(w), float(L), float(d)
+    x = np.array([L / 2.0, L / 2.0, -L / 2.0, -L / 2.0, L / 2.0])
+    y = np.array([w / 2.0, -w / 2.0, -w / 2.0, w / 2.0, w / 2.0])
+
+    # the 4 edges and the first edge once more to close the contour
+    seg = np.array([0, 1, 2, 3, 4])
+    seg_end = np.array([1, 2, 3, 4, 1])
+
+    theta = np.arange(0.0, 1.0, min(d / w, d / L))
+    rx = ((1.0 - theta) * x[seg, None] + theta * x[seg_end, None]).ravel()
+    ry = ((1.0 - theta) * y[seg, None] + theta * y[seg_end, None]).ravel()
+    n_edges = tuple(theta.size * np.arange(1, 5))
+
+    rx.flags.writeable = False
+    ry.flags.writeable = False
+    return rx, ry, n_edges
+
+
 class VehicleSimulator:
     def __init__(self, x, y, v, max_v, yaw, a, omega, w, L, d):
         self.x = float(x)
@@ -14,19 +52,22 @@ class VehicleSimulator:
         self.W = float(w)
         self.L = float(L)
         self.d = d
-        self.n_edges = []
-        self.edges = []
+        # position the visible edges are chosen for, the radar sets its own
+        self.viewpoint = (0.0, 0.0)
         self._calc_vehicle_contour()
         self.calc_global_contour()
 
+    def set_viewpoint(self, x, y):
+        if (x, y) != self.viewpoint:
+            self.viewpoint = (x, y)
+            self.calc_global_contour()
+
     def update(self, dt):
-        self.x += self.v * np.cos(self.yaw) * dt
-        self.y += self.v * np.sin(self.yaw) * dt
-        self.yaw += self.omega * dt
-        self.v += self.a * dt
-        if self.v >= self.max_v:
-            self.v = self.max_v
-        self.calc_global_contour()
+        with profiling.stage('kinematics'):
+            self.x, self.y, self.yaw, self.v = advance(
+                self.x, self.y, self.yaw, self.v, self.a, self.omega, self.max_v, dt)
+        with profiling.stage('contour'):
+            self.calc_global_contour()
 
     def plot(self):
         
@@ -50,8 +91,9 @@ class VehicleSimulator:
         edges[2] = coords[self.n_edges[1]:self.n_edges[2]]
         edges[3] = coords[self.n_edges[2]:self.n_edges[3]]
 
-        d_cr = [np.hypot(*edges[0][0]), np.hypot(*edges[1][0]), np.hypot(*edges[2][0]), np.hypot(*edges[3][0])]
-        
+        vx, vy = self.viewpoint
+        d_cr = [np.hypot(edges[k][0][0] - vx, edges[k][0][1] - vy) for k in range(4)]
+
         far_cr = d_cr.index(max(d_cr))
 
         c1 = (far_cr + 1) % 4
@@ -62,40 +104,127 @@ class VehicleSimulator:
         return gx, gy
 
     def _calc_vehicle_contour(self):
+        self.vc_x, self.vc_y, self.n_edges = contour_template(self.W, self.L, self.d)
 
-        self.vc_x = []
-        self.vc_y = []
 
-        self.vc_x.append(self.L / 2.0)
-        self.vc_y.append(self.W / 2.0)
+class VehicleFleet:
+    # struct-of-arrays container that advances all objects at once,
+    # the contour points of all objects are kept in flat arrays
+    def __init__(self, x, y, v, max_v, yaw, a, omega, w, L, d):
+        self.x = np.array(x, dtype=np.float64, ndmin=1)
+        self.y = np.array(y, dtype=np.float64, ndmin=1)
+        self.yaw = np.deg2rad(np.array(yaw, dtype=np.float64, ndmin=1))
+        self.v = np.array(v, dtype=np.float64, ndmin=1)
+        self.a = np.array(a, dtype=np.float64, ndmin=1)
+        self.omega = np.array(omega, dtype=np.float64, ndmin=1)
+        self.max_v = np.array(max_v, dtype=np.float64, ndmin=1)
+        self.W = np.array(w, dtype=np.float64, ndmin=1)
+        self.L = np.array(L, dtype=np.float64, ndmin=1)
+        self.d = d
+        # position the visible edges are chosen for, the radar sets its own
+        self.viewpoint = (0.0, 0.0)
+        self._calc_fleet_contour()
+        self.calc_global_contour()
 
-        self.vc_x.append(self.L / 2.0)
-        self.vc_y.append(-self.W / 2.0)
+    def __len__(self):
+        return self.x.size
 
-        self.vc_x.append(-self.L / 2.0)
-        self.vc_y.append(-self.W / 2.0)
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return VehicleView(self, i % len(self))
 
-        self.vc_x.append(-self.L / 2.0)
-        self.vc_y.append(self.W / 2.0)
+    def __iter__(self):
+        for i in range(len(self)):
+            yield VehicleView(self, i)
 
-        self.vc_x.append(self.L / 2.0)
-        self.vc_y.append(self.W / 2.0)
+    def update(self, dt):
+        with profiling.stage('kinematics'):
+            self.x, self.y, self.yaw, self.v = advance(
+                self.x, self.y, self.yaw, self.v, self.a, self.omega, self.max_v, dt)
+        with profiling.stage('contour'):
+            self.calc_global_contour()
 
-        self.vc_x, self.vc_y = self._interpolate(self.vc_x, self.vc_y)
+    def calc_global_contour(self):
+        # rotation by 90° - yaw of every object applied to its contour points
+        phi = np.deg2rad(90) - self.yaw[self.owner]
+        cos, sin = np.cos(phi), np.sin(phi)
+        self.gx = self.vc_x * cos + self.vc_y * sin + self.x[self.owner]
+        self.gy = self.vc_y * cos - self.vc_x * sin + self.y[self.owner]
+        self._select_visible()
+        return self.gx, self.gy
+
+    def set_viewpoint(self, x, y):
+        if (x, y) != self.viewpoint:
+            self.viewpoint = (x, y)
+            self._select_visible()
+
+    def _select_visible(self):
+        # the edge that starts in the corner farthest from the viewpoint and
+        # the one before it are hidden, the two others are visible
+        corners = self.edge_start
+        vx, vy = self.viewpoint
+        d_cr = np.hypot(self.gx[corners] - vx, self.gy[corners] - vy)
+        far_cr = np.argmax(d_cr, axis=1)
+        c1 = (far_cr + 1) % 4
+        c2 = (far_cr + 2) % 4
 
-    def _interpolate(self, x, y):
-        rx, ry = [], []
-        d_theta = min(self.d / self.W, self.d / self.L)
-        for i in range(len(x) - 1):
-            rx.extend([(1.0 - theta) * x[i] + theta * x[i + 1]
-                       for theta in np.arange(0.0, 1.0, d_theta)])
-            ry.extend([(1.0 - theta) * y[i] + theta * y[i + 1]
-                       for theta in np.arange(0.0, 1.0, d_theta)])
-            self.n_edges.append(len(rx))
+        visible = (self.edge == c1[self.owner]) | (self.edge == c2[self.owner])
+        self.visible_idx = np.flatnonzero(visible)
+        self.visible_coords = np.stack([self.gx[self.visible_idx], self.gy[self.visible_idx]], -1)
+        self.visible_owner = self.owner[self.visible_idx]
+
+    def _calc_fleet_contour(self):
+        # one contour template per distinct object size
+        sizes = np.stack([self.W, self.L], -1)
+        uniq, inverse = np.unique(sizes, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        templates = [contour_template(w, L, self.d) for w, L in uniq]
+
+        tpl_x = np.concatenate([t[0] for t in templates]) if templates else np.empty(0)
+        tpl_y = np.concatenate([t[1] for t in templates]) if templates else np.empty(0)
+        tpl_n = np.array([t[0].size for t in templates], dtype=np.int64)
+        tpl_start = np.concatenate([[0], np.cumsum(tpl_n)])
+        tpl_edge_start = np.array([(0,) + t[2][:3] for t in templates], dtype=np.int64).reshape(-1, 4)
+        tpl_edge = np.concatenate([np.repeat(np.arange(5), t[2][0]) for t in templates]) \
+            if templates else np.empty(0, dtype=np.int64)
+        # points of the closing segment do not belong to any edge
+        tpl_edge[tpl_edge == 4] = -1
+
+        counts = tpl_n[inverse]
+        # contour points of the object i are start[i]:start[i + 1]
+        self.start = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.owner = np.repeat(np.arange(len(self)), counts)
+        idx = tpl_start[inverse][self.owner] + np.arange(self.start[-1]) - self.start[self.owner]
+
+        self.vc_x = tpl_x[idx]
+        self.vc_y = tpl_y[idx]
+        self.edge = tpl_edge[idx]
+        self.edge_start = self.start[:-1, None] + tpl_edge_start[inverse]
+
+class VehicleView:
+    # read-only view of one object of a VehicleFleet, used for plotting
+    def __init__(self, fleet, i):
+        self.fleet = fleet
+        self.i = i
+
+    x = property(lambda self: self.fleet.x[self.i])
+    y = property(lambda self: self.fleet.y[self.i])
+    yaw = property(lambda self: self.fleet.yaw[self.i])
+    v = property(lambda self: self.fleet.v[self.i])
+    W = property(lambda self: self.fleet.W[self.i])
+    L = property(lambda self: self.fleet.L[self.i])
+
+    @property
+    def visible_coords(self):
+        lo, hi = np.searchsorted(self.fleet.visible_owner, [self.i, self.i + 1])
+        return self.fleet.visible_coords[lo:hi]
 
-        rx.extend([(1.0 - theta) * x[len(x) - 1] + theta * x[1]
-                   for theta in np.arange(0.0, 1.0, d_theta)])
-        ry.extend([(1.0 - theta) * y[len(y) - 1] + theta * y[1]
-                   for theta in np.arange(0.0, 1.0, d_theta)])
+    def calc_global_contour(self):
+        start, stop = self.fleet.start[self.i], self.fleet.start[self.i + 1]
+        return self.fleet.gx[start:stop], self.fleet.gy[start:stop]
 
-        return rx, ry
+    def plot(self):
+        plt.plot(self.x, self.y, ".b")
+        gx, gy = self.calc_global_contour()
+        plt.plot(gx, gy, color="k")
@@ -0,0 +1,120 @@
+import numpy as np
+
+import profiling
+
+
+def bearing(radar, x, y):
+    # azimuth (°) of the points relative to the heading of the radar,
+    # positive to the right, in [-180, 180)
+    angle = np.rad2deg(radar.yaw - np.arctan2(y - radar.y, x - radar.x))
+    return (angle + 180) % 360 - 180
+
+
+def cull_objects(radar, x, y, radius, max_range):
+    # objects whose bounding circle lies completely outside of the range or
+    # the field of view of the radar are dropped before their points are used
+    dist = np.hypot(x - radar.x, y - radar.y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_width = np.rad2deg(np.arcsin(np.minimum(radius / dist, 1.0)))
+    half_width[dist <= radius] = 180
+    return (dist - radius <= max_range) & (np.abs(bearing(radar, x, y)) - half_width <= radar.max_angle)
+
+
+def footprints(vehs):
+    # centers, bounding radii and (n, 4, 2) corners of all objects
+    if hasattr(vehs, 'edge_start'):
+        corners = np.stack([vehs.gx[vehs.edge_start], vehs.gy[vehs.edge_start]], -1)
+        return vehs.x, vehs.y, np.hypot(vehs.W, vehs.L) / 2, corners
+    corners = []
+    for veh in vehs:
+        gx, gy = veh.calc_global_contour()
+        idx = [0] + list(veh.n_edges[:3])
+        corners.append(np.stack([gx[idx], gy[idx]], -1))
+    x = np.array([veh.x for veh in vehs], dtype=np.float64)
+    y = np.array([veh.y for veh in vehs], dtype=np.float64)
+    radius = np.array([np.hypot(veh.W, veh.L) / 2 for veh in vehs], dtype=np.float64)
+    return x, y, radius, np.array(corners, dtype=np.float64).reshape(-1, 4, 2)
+
+
+def object_points(vehs):
+    # visible contour points of all objects with the velocity and heading of
+    # their object and the index of the object
+    if hasattr(vehs, 'visible_owner'):
+        owner = vehs.visible_owner
+        return vehs.visible_coords, vehs.v[owner], vehs.yaw[owner], owner
+    coords = [np.asarray(veh.visible_coords, dtype=np.float64).reshape(-1, 2) for veh in vehs]
+    if not coords:
+        return np.empty((0, 2)), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(coords)), [len(c) for c in coords])
+    v = np.array([veh.v for veh in vehs], dtype=np.float64)[owner]
+    yaw = np.array([veh.yaw for veh in vehs], dtype=np.float64)[owner]
+    return np.concatenate(coords), v, yaw, owner
+
+
+def occluder_depth(radar, corners, owner, bin_width):
+    # angular bucket index of the object footprints: for every azimuth bin of
+    # bin_width (°) the range at which its central ray first hits one of the
+    # edges of the objects and the index of that object (-1 if none)
+    n_bins = int(np.ceil(360 / bin_width))
+    depth = np.full(n_bins, np.inf)
+    nearest = np.full(n_bins, -1, dtype=np.int64)
+    if corners.shape[0] == 0:
+        return depth, nearest
+
+    p0 = corners.reshape(-1, 2)
+    p1 = np.roll(corners, -1, axis=1).reshape(-1, 2)
+    seg_owner = np.repeat(owner, 4)
+    a0 = bearing(radar, p0[:, 0], p0[:, 1])
+    a1 = bearing(radar, p1[:, 0], p1[:, 1])
+    # edges crossing the ±180° direction behind the radar are split off by
+    # taking the shorter way around
+    span = (a1 - a0 + 180) % 360 - 180
+    lo = np.floor((np.minimum(a0, a0 + span) + 180) / bin_width).astype(np.int64)
+    hi = np.floor((np.maximum(a0, a0 + span) + 180) / bin_width).astype(np.int64)
+
+    count = hi - lo + 1
+    seg = np.repeat(np.arange(count.size), count)
+    b = lo[seg] + np.arange(seg.size) - np.repeat(np.cumsum(count) - count, count)
+    # world direction of the central ray of every bin
+    phi = radar.yaw - np.deg2rad((b + 0.5) * bin_width - 180)
+    ux, uy = np.cos(phi), np.sin(phi)
+    ex, ey = (p1 - p0)[seg, 0], (p1 - p0)[seg, 1]
+    qx, qy = p0[seg, 0] - radar.x, p0[seg, 1] - radar.y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = ux * ey - uy * ex
+        t = (qx * ey - qy * ex) / denom
+        s = (qx * uy - qy * ux) / denom
+    hit = (s >= 0) & (s <= 1) & (t > 0) & np.isfinite(t)
+    b, t, seg = b[hit] % n_bins, t[hit], seg[hit]
+
+    order = np.lexsort((t, b))
+    b, first = np.unique(b[order], return_index=True)
+    depth[b] = t[order][first]
+    nearest[b] = seg_owner[seg[order][first]]
+    return depth, nearest
+
+
+def visible_points(radar, vehs):
+    # points of the objects the radar can see: objects out of range or out of
+    # the field of view are culled as a whole, with radar.occlusion points
+    # behind the nearest object of their azimuth bin are dropped as well
+    with profiling.stage('visibility'):
+        max_range = radar.visible_range()
+        x, y, radius, corners = footprints(vehs)
+        candidates = cull_objects(radar, x, y, radius, max_range)
+        profiling.count('culled_objects', int(candidates.size - candidates.sum()))
+
+        coords, v, yaw, owner = object_points(vehs)
+        keep = candidates[owner]
+        coords, v, yaw, owner = coords[keep], v[keep], yaw[keep], owner[keep]
+        if not radar.occlusion or coords.shape[0] == 0:
+            return coords, v, yaw
+
+        idx = np.flatnonzero(candidates)
+        depth, nearest = occluder_depth(radar, corners[idx], idx, radar.occlusion_bin)
+        dist = np.hypot(coords[:, 0] - radar.x, coords[:, 1] - radar.y)
+        b = np.floor((bearing(radar, coords[:, 0], coords[:, 1]) + 180) / radar.occlusion_bin).astype(np.int64)
+        b %= depth.size
+        visible = (nearest[b] == owner) | (nearest[b] < 0) | (dist <= depth[b])
+        profiling.count('occluded_points', int(visible.size - visible.sum()))
+        return coords[visible], v[visible], yaw[visible]
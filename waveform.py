@@ -0,0 +1,122 @@
+import numpy as np
+
+import dsp
+
+C = 299792458
+
+# parameters that define a waveform, the other attributes are derived from them
+WAVEFORM_PARAMS = ('f_0', 'f_r', 'f_chirp', 'n_r', 'f_s', 'n_s')
+
+
+class Waveform:
+    # chirp sequence of the radar and the constants derived from it. A waveform
+    # is not changed after creation: the time base and the axes are computed
+    # on first use and cached, replace() returns a new configuration
+    def __init__(self, f_0=77.7*1e9, f_r=200*1e6, f_chirp=50*1e3, n_r=150, f_s=None, n_s=None):
+        self.c = C
+        self.f_0 = float(f_0) # carrier frequency
+        self.f_r = float(f_r) # ramp frequency
+        self.f_chirp = float(f_chirp) # chirp sequence frequency
+        self.n_r = int(n_r) # number of chirps
+        if f_s is None and n_s is None:
+            f_s = 50e6
+        if min(self.f_0, self.f_r, self.f_chirp, f_s if f_s is not None else 1) <= 0:
+            raise ValueError("Частоты сигнала радара должны быть положительными")
+
+        self.T_r = 1/self.f_chirp # duration of one cycle
+        self.m_w = self.f_r/self.T_r
+        self.T_M = self.T_r*self.n_r
+        # the samples of a chirp fill the whole ramp, so the sample rate is
+        # always n_s*f_chirp: given the rate, the samples per chirp follow it
+        # (rounded down), given the samples the rate follows them. The value
+        # as it was given is kept for replace(), so the rounding does not add up
+        self._given = ('f_s', float(f_s)) if n_s is None else ('n_s', int(n_s))
+        self.n_s = int(self.T_r*float(f_s)) if n_s is None else int(n_s)
+        if self.n_r < 1 or self.n_s < 1:
+            raise ValueError("Число чирпов и отсчетов в чирпе должно быть положительным")
+        self.f_s = self.n_s*self.f_chirp # sample rate
+        if f_s is not None and n_s is not None and not np.isclose(self.f_s, float(f_s), rtol=1e-9, atol=0):
+            raise ValueError("Частота дискретизации f_s должна быть равна n_s*f_chirp = %g Гц, задано %g Гц"
+                             % (self.f_s, float(f_s)))
+
+        self.d = self.c / (8 * self.f_r)
+        self._cache = {}
+
+    def params(self):
+        return {name: getattr(self, name) for name in WAVEFORM_PARAMS}
+
+    def replace(self, **changes):
+        unknown = set(changes) - set(WAVEFORM_PARAMS)
+        if unknown:
+            raise ValueError("Неизвестные параметры сигнала радара: %s" % ', '.join(sorted(unknown)))
+        params = self.params()
+        # the sample rate and the samples per chirp are tied, only the one
+        # that was given is kept (as given) unless one of them is changed
+        params.pop('f_s')
+        params.pop('n_s')
+        if 'f_s' not in changes and 'n_s' not in changes:
+            name, value = self._given
+            params[name] = value
+        params.update(changes)
+        return Waveform(**params)
+
+    def __eq__(self, other):
+        return isinstance(other, Waveform) and self.params() == other.params()
+
+    def __hash__(self):
+        return hash(tuple(self.params().items()))
+
+    def __repr__(self):
+        return 'Waveform(%s)' % ', '.join('%s=%r' % kv for kv in self.params().items())
+
+    def __getstate__(self):
+        # the cache is rebuilt in the worker processes instead of being sent
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def _cached(self, key, make):
+        value = self._cache.get(key)
+        if value is None:
+            value = make()
+            value.setflags(write=False)
+            self._cache[key] = value
+        return value
+
+    @property
+    def wavelength(self):
+        return self.c / self.f_0
+
+    @property
+    def dt(self):
+        # sample period of the time base, which ends at T_M, so it is a bit
+        # longer than 1/f_s
+        return self.T_M / max(self.n_r*self.n_s - 1, 1)
+
+    @property
+    def t_sample(self):
+        # sample times of the whole chirp sequence, n_r*n_s
+        return self._cached('t_sample', lambda: np.linspace(0, self.T_M, self.n_r*self.n_s))
+
+    @property
+    def t_ramp(self):
+        # sample times inside the ramp, t % T_r
+        return self._cached('t_ramp', lambda: self.t_sample % self.T_r)
+
+    def freq_to_range(self, f):
+        return f*self.c/(2*self.m_w)
+
+    def angle_freq_to_velocity(self, w):
+        return w*self.c/(4*np.pi*self.f_0)
+
+    def range_axis(self, n_fft=None):
+        # ranges (m) of the bins of a range FFT of n_fft (default n_s) points
+        n_fft = n_fft or self.n_s
+        return self._cached(('range_axis', n_fft), lambda: np.around(
+            self.freq_to_range(dsp.range_bins(n_fft, self.f_s)), decimals = 1))
+
+    def velocity_axis(self, n_fft=None):
+        # velocities (m/s) of the bins of a Doppler FFT of n_fft (default n_r) points
+        n_fft = n_fft or self.n_r
+        return self._cached(('velocity_axis', n_fft), lambda: np.around(
+            self.angle_freq_to_velocity(dsp.doppler_bins(n_fft, self.f_chirp)), decimals = 1))
@@ -0,0 +1,291 @@
+import json
+import os
+import queue
+import threading
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from detection import DETECTION_DTYPE
+
+# names of the row and column axes of every map type
+MAP_AXES = {
+    'vel-rad': ('velocity', 'range'),
+    'azim-rad': ('angle', 'range'),
+}
+
+# labels of the CSV rows and columns of the axes
+CSV_LABELS = {
+    'velocity': 'v = %.2f',
+    'angle': 'a = %.2f',
+    'range': 'r = %.2f',
+}
+
+META_FILE = 'meta.json'
+
+# detections of all ticks are stored as records with the time of their tick
+DETECTION_RECORD_DTYPE = np.dtype([('time', np.float64)] + DETECTION_DTYPE.descr)
+DETECTIONS = 'detections'
+
+
+class FrameWriter:
+    # receives the maps of every tick, subclasses decide how they are stored
+    def write(self, kind, time, table, rows, columns):
+        raise NotImplementedError
+
+    def write_detections(self, time, detections):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullFrameWriter(FrameWriter):
+    def write(self, kind, time, table, rows, columns):
+        pass
+
+    def write_detections(self, time, detections):
+        pass
+
+
+class CsvFrameWriter(FrameWriter):
+    # one CSV file per map and tick in path/<kind>/<time>sec.csv
+    def __init__(self, path):
+        self.path = path
+        # row and column labels of every map type, rebuilt when the axes change
+        self.labels = {}
+        for kind in MAP_AXES:
+            os.makedirs(os.path.join(path, kind), exist_ok=True)
+
+    def _labels(self, kind, rows, columns):
+        rows, columns = np.asarray(rows), np.asarray(columns)
+        key = (rows.tobytes(), columns.tobytes())
+        cached = self.labels.get(kind)
+        if cached is None or cached[0] != key:
+            row_name, col_name = MAP_AXES[kind]
+            cached = (key, pd.Index([CSV_LABELS[row_name] % i for i in rows]),
+                      pd.Index([CSV_LABELS[col_name] % i for i in columns]))
+            self.labels[kind] = cached
+        return cached[1], cached[2]
+
+    def write(self, kind, time, table, rows, columns):
+        with profiling.stage('dataframe'):
+            index, columns = self._labels(kind, rows, columns)
+            table = pd.DataFrame(data=table, columns=columns, index=index)
+        path = os.path.join(self.path, kind, str(round(time, 1)) + 'sec.csv')
+        with profiling.stage('csv_write'):
+            table.to_csv(path)
+        profiling.count('bytes_written', os.path.getsize(path))
+
+    def write_detections(self, time, detections):
+        os.makedirs(os.path.join(self.path, DETECTIONS), exist_ok=True)
+        pd.DataFrame(detections).to_csv(
+            os.path.join(self.path, DETECTIONS, str(round(time, 1)) + 'sec.csv'), index=False)
+
+
+class BinaryFrameWriter(FrameWriter):
+    # appendable binary container: path/<kind>.dat holds the frames of a map
+    # type one after another, path/<kind>.time their times and meta.json the
+    # dtype, frame shape and axes, which are stored only once
+    def __init__(self, path, dtype=np.float32):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.files = {}
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'maps': {}}
+
+    def write(self, kind, time, table, rows, columns):
+        if kind not in self.files:
+            self._open(kind, table, rows, columns)
+        meta = self.meta['maps'][kind]
+        table = np.ascontiguousarray(table, dtype=meta['dtype'])
+        if list(table.shape) != meta['shape']:
+            raise ValueError("Размер карты %s %s не совпадает с размером в файле %s"
+                             % (kind, table.shape, tuple(meta['shape'])))
+        data, times = self.files[kind]
+        with profiling.stage('binary_write'):
+            data.write(table.tobytes())
+            times.write(np.float64(time).tobytes())
+        profiling.count('bytes_written', table.nbytes + 8)
+
+    def write_detections(self, time, detections):
+        if DETECTIONS not in self.files:
+            if DETECTIONS not in self.meta:
+                self.meta[DETECTIONS] = {'dtype': DETECTION_RECORD_DTYPE.descr,
+                                         'data': DETECTIONS + '.dat'}
+                self._write_meta()
+            self.files[DETECTIONS] = (open(os.path.join(self.path, self.meta[DETECTIONS]['data']), 'ab'),)
+        records = np.zeros(len(detections), dtype=DETECTION_RECORD_DTYPE)
+        records['time'] = time
+        for name in DETECTION_DTYPE.names:
+            records[name] = detections[name]
+        self.files[DETECTIONS][0].write(records.tobytes())
+
+    def close(self):
+        for files in self.files.values():
+            for f in files:
+                f.close()
+        self.files = {}
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(self.meta, f)
+
+    def _open(self, kind, table, rows, columns):
+        if kind not in self.meta['maps']:
+            row_name, col_name = MAP_AXES[kind]
+            self.meta['maps'][kind] = {
+                'dtype': self.dtype.str,
+                'shape': list(np.shape(table)),
+                'axes': {row_name: np.asarray(rows).tolist(),
+                         col_name: np.asarray(columns).tolist()},
+                'data': kind + '.dat',
+                'time': kind + '.time',
+            }
+            self._write_meta()
+        meta = self.meta['maps'][kind]
+        self.files[kind] = (open(os.path.join(self.path, meta['data']), 'ab'),
+                            open(os.path.join(self.path, meta['time']), 'ab'))
+
+
+class AsyncFrameWriter(FrameWriter):
+    # hands the maps to another writer in a background thread. write blocks
+    # while max_queue frames are waiting (back-pressure), close writes all
+    # queued frames. Tables must not be changed after they are passed to write
+    def __init__(self, writer, max_queue=16):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.error = None
+
+        self.frames_written = 0
+        self.max_queue_depth = 0
+        self.blocked_time = 0.0 # time spent waiting for a free place in the queue
+        self.write_time = 0.0
+        self.max_write_latency = 0.0 # from write to the end of the inner write
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def write(self, kind, time, table, rows, columns):
+        self._put(self.writer.write, kind, time, table, rows, columns)
+
+    def write_detections(self, time, detections):
+        self._put(self.writer.write_detections, time, detections)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.writer.close()
+        self._check_error()
+
+    def stats(self):
+        return {
+            'frames_written': self.frames_written,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'blocked_time': self.blocked_time,
+            'write_time': self.write_time,
+            'mean_write_time': self.write_time / max(self.frames_written, 1),
+            'max_write_latency': self.max_write_latency,
+        }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                # the frames after an error are dropped, the error is raised
+                # in the simulation thread
+                continue
+            queued, write, args = item
+            start = timer.perf_counter()
+            try:
+                write(*args)
+            except Exception as e:
+                self.error = e
+                continue
+            end = timer.perf_counter()
+            self.write_time += end - start
+            self.max_write_latency = max(self.max_write_latency, end - queued)
+            self.frames_written += 1
+
+    def _put(self, write, *args):
+        self._check_error()
+        start = timer.perf_counter()
+        self.queue.put((start, write, args))
+        self.blocked_time += timer.perf_counter() - start
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def _check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+class FrameSet:
+    # frames of one map type of a binary container, data is a read-only
+    # memory map of shape (n_frames,) + frame shape
+    def __init__(self, path, kind, meta):
+        self.kind = kind
+        self.dtype = np.dtype(meta['dtype'])
+        self.shape = tuple(meta['shape'])
+        self.axes = {name: np.array(values) for name, values in meta['axes'].items()}
+        self.times = np.fromfile(os.path.join(path, meta['time']), dtype=np.float64)
+
+        data_path = os.path.join(path, meta['data'])
+        frame_bytes = self.dtype.itemsize * int(np.prod(self.shape))
+        # a frame whose time was not written yet is not complete
+        n_frames = min(self.times.size, os.path.getsize(data_path) // frame_bytes)
+        self.times = self.times[:n_frames]
+        if n_frames == 0:
+            self.data = np.empty((0,) + self.shape, dtype=self.dtype)
+        else:
+            self.data = np.memmap(data_path, dtype=self.dtype, mode='r',
+                                  shape=(n_frames,) + self.shape)
+
+    def __len__(self):
+        return self.times.size
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+
+def load_frames(path):
+    # {map type: FrameSet} of a directory written by BinaryFrameWriter
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+    return {kind: FrameSet(path, kind, m) for kind, m in meta['maps'].items()}
+
+
+def load_detections(path):
+    # records of all detections of a directory written by BinaryFrameWriter,
+    # the detections of one tick share the value of the time field
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+    if DETECTIONS not in meta:
+        return np.zeros(0, dtype=DETECTION_RECORD_DTYPE)
+    data_path = os.path.join(path, meta[DETECTIONS]['data'])
+    dtype = np.dtype([tuple(field) for field in meta[DETECTIONS]['dtype']])
+    n = os.path.getsize(data_path) // dtype.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(data_path, dtype=dtype, mode='r', shape=(n,))